@@ -0,0 +1,211 @@
+# benchmarks/bench_concurrency.py
+"""
+Mixed readers and writers on the shared SQLite engine: reader threads load
+the index summaries and a stored playlist, writer threads upsert a
+playlist's videos and items, and one thread keeps updating a sync task,
+like the sync persister does. Prints throughput, read latency and errors.
+
+    python -m benchmarks.bench_concurrency [--seconds 5] [--readers 8]
+        [--writers 4]
+"""
+import argparse
+import datetime
+import random
+import threading
+import time
+
+from benchmarks.scratch import use_scratch_database
+
+use_scratch_database()
+
+from sqlalchemy import insert, text  # noqa: E402
+
+from database import (  # noqa: E402
+    Playlist,
+    PlaylistItem,
+    SyncTask,
+    bulk_upsert_playlist_items,
+    bulk_upsert_videos,
+    get_session,
+)
+from utils_playlist import (  # noqa: E402
+    db_engine,
+    get_playlist_summaries,
+    get_stored_playlist,
+)
+
+PLAYLISTS = 50
+VIDEOS_PER_PLAYLIST = 200
+
+
+def seed():
+    now = datetime.datetime.now()
+    session = get_session(db_engine)
+    try:
+        session.execute(
+            insert(Playlist),
+            [
+                {
+                    "id": f"PL{p}",
+                    "title": f"Playlist {p}",
+                    "channel_name": "Benchmark",
+                    "video_count": VIDEOS_PER_PLAYLIST,
+                    "url": f"https://www.youtube.com/playlist?list=PL{p}",
+                    "last_updated": now,
+                    "last_analyzed": now,
+                }
+                for p in range(PLAYLISTS)
+            ],
+        )
+        for p in range(PLAYLISTS):
+            bulk_upsert_videos(session, _video_rows(p, 0))
+        session.execute(
+            insert(PlaylistItem),
+            [
+                {
+                    "playlist_id": f"PL{p}",
+                    "video_id": f"v{p}_{i}",
+                    "position": i,
+                    "is_top": i % 9 == 0,
+                }
+                for p in range(PLAYLISTS)
+                for i in range(VIDEOS_PER_PLAYLIST)
+            ],
+        )
+        session.add(SyncTask(status="inprogress", total_playlists=PLAYLISTS))
+        session.commit()
+    finally:
+        session.close()
+
+
+def _video_rows(p, views_offset):
+    now = datetime.datetime.now()
+    return [
+        {
+            "id": f"v{p}_{i}",
+            "title": f"Video {i} of playlist {p}",
+            "channel_name": "Benchmark",
+            "upload_date": now,
+            "duration": 3.0,
+            "views": 1000 + i + views_offset,
+            "likes": i,
+            "like_percentage": i / (1000 + i + views_offset) * 100,
+            "url": f"https://www.youtube.com/watch?v=v{p}_{i}",
+            "stats_updated_at": now,
+        }
+        for i in range(VIDEOS_PER_PLAYLIST)
+    ]
+
+
+class Counters:
+    def __init__(self):
+        self.counts = {"reads": 0, "writes": 0, "task_updates": 0, "errors": 0}
+        self.read_latencies = []
+        self._lock = threading.Lock()
+
+    def add(self, name, latency=None):
+        with self._lock:
+            self.counts[name] += 1
+            if latency is not None:
+                self.read_latencies.append(latency)
+
+
+def reader(stop_at, counters):
+    while time.monotonic() < stop_at:
+        start = time.perf_counter()
+        try:
+            get_playlist_summaries(limit=60)
+            get_stored_playlist(f"PL{random.randrange(PLAYLISTS)}", max_age=None)
+            counters.add("reads", time.perf_counter() - start)
+        except Exception:
+            counters.add("errors")
+
+
+def writer(stop_at, counters):
+    while time.monotonic() < stop_at:
+        p = random.randrange(PLAYLISTS)
+        session = get_session(db_engine)
+        try:
+            bulk_upsert_videos(session, _video_rows(p, random.randrange(10**6)))
+            bulk_upsert_playlist_items(
+                session,
+                [
+                    {
+                        "playlist_id": f"PL{p}",
+                        "video_id": f"v{p}_{i}",
+                        "position": i,
+                        "is_top": random.random() < 0.1,
+                    }
+                    for i in range(VIDEOS_PER_PLAYLIST)
+                ],
+            )
+            session.commit()
+            counters.add("writes")
+        except Exception:
+            session.rollback()
+            counters.add("errors")
+        finally:
+            session.close()
+
+
+def task_updater(stop_at, counters):
+    while time.monotonic() < stop_at:
+        session = get_session(db_engine)
+        try:
+            session.query(SyncTask).update(
+                {"processed_playlists": random.randrange(PLAYLISTS)}
+            )
+            session.commit()
+            counters.add("task_updates")
+        except Exception:
+            session.rollback()
+            counters.add("errors")
+        finally:
+            session.close()
+        time.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    args = parser.parse_args()
+
+    seed()
+    with db_engine.connect() as connection:
+        journal_mode = connection.execute(text("PRAGMA journal_mode")).scalar()
+    print(f"journal_mode={journal_mode}, pool size {db_engine.pool.size()}")
+
+    counters = Counters()
+    stop_at = time.monotonic() + args.seconds
+    targets = [reader] * args.readers + [writer] * args.writers + [task_updater]
+    threads = [
+        threading.Thread(target=target, args=(stop_at, counters)) for target in targets
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies = sorted(counters.read_latencies) or [0.0]
+    print(
+        f"{args.readers} readers, {args.writers} writers, 1 task updater, "
+        f"{args.seconds:g} s"
+    )
+    print(
+        ", ".join(
+            f"{name} {count / args.seconds:.1f}/s"
+            for name, count in counters.counts.items()
+            if name != "errors"
+        )
+        + f", errors {counters.counts['errors']}"
+    )
+    print(
+        f"read latency p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# benchmarks/bench_fetch.py
+"""
+Wall-clock time per 1,000 videos for fetching a playlist from a stubbed
+YouTube client with a fixed latency per API call, page by page (the old
+fetch) versus the pipelined fetch_playlist_videos().
+
+    python -m benchmarks.bench_fetch [--latency 0.02] [--videos 1000 5000]
+"""
+import argparse
+import time
+
+from benchmarks.scratch import use_scratch_database
+
+use_scratch_database()
+
+from tests.youtube_stub import StubYouTube  # noqa: E402
+from utils_playlist import (  # noqa: E402
+    YOUTUBE_FETCH_CONCURRENCY,
+    _fetch_video_chunk,
+    fetch_playlist_videos,
+    iter_playlist_item_pages,
+)
+
+
+def fetch_sequential(youtube, playlist_id):
+    """Every playlistItems page first, then one videos.list call after another"""
+    video_ids = [
+        item["video_id"]
+        for page in iter_playlist_item_pages(youtube, playlist_id)
+        for item in page
+    ]
+    videos = []
+    for i in range(0, len(video_ids), 50):
+        videos.extend(_fetch_video_chunk(youtube, video_ids[i : i + 50]))
+    return videos
+
+
+def fetch_pipelined(youtube, playlist_id):
+    return fetch_playlist_videos(youtube, playlist_id, force_refresh=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="seconds per API call"
+    )
+    parser.add_argument("--videos", type=int, nargs="+", default=[1000, 5000])
+    args = parser.parse_args()
+
+    youtube = StubYouTube(latency=args.latency)
+    print(
+        f"latency {args.latency * 1000:.0f} ms per call, "
+        f"YOUTUBE_FETCH_CONCURRENCY={YOUTUBE_FETCH_CONCURRENCY}"
+    )
+    for video_count in args.videos:
+        playlist_id = youtube.add_playlist(video_count)
+        for name, fetch in (
+            ("sequential", fetch_sequential),
+            ("pipelined", fetch_pipelined),
+        ):
+            start = time.perf_counter()
+            videos = fetch(youtube, playlist_id)
+            elapsed = time.perf_counter() - start
+            assert len(videos) == video_count
+            print(
+                f"{video_count:6} videos  {name:10}  {elapsed:6.2f} s  "
+                f"{elapsed / video_count * 1000:5.2f} s per 1,000 videos"
+            )
+
+
+if __name__ == "__main__":
+    main()
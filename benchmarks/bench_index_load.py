@@ -0,0 +1,253 @@
+# benchmarks/bench_index_load.py
+"""
+Latency of `/` under load while SSE clients hold /sync/events streams open,
+with the app's routes served by uvicorn on a local port. Compares the async
+index handler with the old one, which read the playlists with the blocking
+get_playlist_summaries() on the event loop. Prints p50/p99 of `/` and of SSE
+event delivery, published a few times a second while the load runs.
+
+    python -m benchmarks.bench_index_load [--seconds 5] [--sse-clients 50]
+        [--clients 8]
+"""
+import argparse
+import datetime
+import json
+import os
+import socket
+import threading
+import time
+
+from benchmarks.scratch import use_scratch_database
+
+use_scratch_database()
+os.environ["AUTO_REFRESH_ENABLED"] = "0"
+
+import requests  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import HTMLResponse  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from database import Playlist, PlaylistItem, bulk_upsert_videos, get_session  # noqa: E402
+from utils_playlist import (  # noqa: E402
+    backfill_playlist_aggregates,
+    db_engine,
+    get_playlist_summaries,
+)
+from views import PLAYLISTS_PAGE_SIZE, router, sync_manager, templates  # noqa: E402
+
+PLAYLISTS = 200
+VIDEOS_PER_PLAYLIST = 100
+EVENTS_PER_SECOND = 5
+
+
+def seed():
+    """Playlists with videos and their playlist_stats rows"""
+    now = datetime.datetime.now()
+    session = get_session(db_engine)
+    try:
+        session.execute(
+            insert(Playlist),
+            [
+                {
+                    "id": f"PL{p}",
+                    "title": f"Playlist {p}",
+                    "channel_name": "Benchmark",
+                    "video_count": VIDEOS_PER_PLAYLIST,
+                    "url": f"https://www.youtube.com/playlist?list=PL{p}",
+                    "last_updated": now - datetime.timedelta(seconds=p),
+                    "last_analyzed": now,
+                }
+                for p in range(PLAYLISTS)
+            ],
+        )
+        bulk_upsert_videos(
+            session,
+            [
+                {
+                    "id": f"v{p}_{i}",
+                    "title": f"Video {i} of playlist {p}",
+                    "channel_name": "Benchmark",
+                    "upload_date": now,
+                    "duration": 3.0,
+                    "views": 1000 + i,
+                    "likes": i,
+                    "like_percentage": i / (1000 + i) * 100,
+                    "url": f"https://www.youtube.com/watch?v=v{p}_{i}",
+                    "stats_updated_at": now,
+                }
+                for p in range(PLAYLISTS)
+                for i in range(VIDEOS_PER_PLAYLIST)
+            ],
+        )
+        session.execute(
+            insert(PlaylistItem),
+            [
+                {
+                    "playlist_id": f"PL{p}",
+                    "video_id": f"v{p}_{i}",
+                    "position": i,
+                    "is_top": i % 9 == 0,
+                }
+                for p in range(PLAYLISTS)
+                for i in range(VIDEOS_PER_PLAYLIST)
+            ],
+        )
+        session.commit()
+    finally:
+        session.close()
+    backfill_playlist_aggregates()
+
+
+async def blocking_index(request: Request):
+    """The old index: blocking summaries query straight on the event loop"""
+    playlists = get_playlist_summaries(limit=PLAYLISTS_PAGE_SIZE + 1)
+    return templates.TemplateResponse(
+        "index.html",
+        {
+            "request": request,
+            "playlists": playlists[:PLAYLISTS_PAGE_SIZE],
+            "next_cursor": None,
+            "message": None,
+            "message_type": "primary",
+            "active_sync": sync_manager.get_active_sync_task(),
+        },
+    )
+
+
+def start_server(app):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+class Latencies:
+    def __init__(self):
+        self.samples = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, latency):
+        with self._lock:
+            self.samples.append(latency)
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def percentiles(self):
+        samples = sorted(self.samples) or [0.0]
+        return (
+            samples[len(samples) // 2] * 1000,
+            samples[int(len(samples) * 0.99)] * 1000,
+        )
+
+
+def sse_client(base_url, stop, delivery):
+    """Hold one event stream open, timing each benchmark event's delivery"""
+    try:
+        with requests.get(f"{base_url}/sync/events", stream=True, timeout=60) as response:
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data: "):
+                    data = json.loads(line[len("data: "):])
+                    if "sent_at" in data:
+                        delivery.add(time.perf_counter() - data["sent_at"])
+                if stop.is_set():
+                    return
+    except requests.RequestException:
+        if not stop.is_set():
+            delivery.error()
+
+
+def publisher(stop):
+    while not stop.wait(1 / EVENTS_PER_SECOND):
+        sync_manager.broadcast_event("bench", {"sent_at": time.perf_counter()})
+
+
+def load_client(url, stop_at, latencies):
+    with requests.Session() as http:
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                http.get(url, timeout=30).raise_for_status()
+                latencies.add(time.perf_counter() - start)
+            except requests.RequestException:
+                latencies.error()
+
+
+def run(base_url, path, args):
+    stop = threading.Event()
+    delivery = Latencies()
+    sse_threads = [
+        threading.Thread(target=sse_client, args=(base_url, stop, delivery), daemon=True)
+        for _ in range(args.sse_clients)
+    ]
+    for thread in sse_threads:
+        thread.start()
+    # Let every stream subscribe before the load starts
+    while len(sync_manager.events.subscribers) < args.sse_clients:
+        time.sleep(0.05)
+    publisher_thread = threading.Thread(target=publisher, args=(stop,))
+    publisher_thread.start()
+
+    latencies = Latencies()
+    stop_at = time.monotonic() + args.seconds
+    clients = [
+        threading.Thread(target=load_client, args=(base_url + path, stop_at, latencies))
+        for _ in range(args.clients)
+    ]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+
+    stop.set()
+    publisher_thread.join()
+    # One last event wakes the streams so their clients see the stop flag
+    sync_manager.broadcast_event("bench", {})
+    for thread in sse_threads:
+        thread.join(timeout=5)
+    return latencies, delivery
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--sse-clients", type=int, default=50)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent `/` clients")
+    args = parser.parse_args()
+
+    seed()
+    app = FastAPI()
+    app.include_router(router)
+    app.add_api_route("/bench/blocking-index", blocking_index, response_class=HTMLResponse)
+    server, server_thread, base_url = start_server(app)
+    print(
+        f"{PLAYLISTS} playlists, {args.sse_clients} SSE clients, "
+        f"{args.clients} `/` clients, {args.seconds:g} s per handler"
+    )
+    try:
+        for name, path in (("blocking", "/bench/blocking-index"), ("async", "/")):
+            latencies, delivery = run(base_url, path, args)
+            p50, p99 = latencies.percentiles()
+            sse_p50, sse_p99 = delivery.percentiles()
+            print(
+                f"{name:9} `/` {len(latencies.samples) / args.seconds:6.1f} req/s  "
+                f"p50 {p50:6.0f} ms  p99 {p99:6.0f} ms  errors {latencies.errors}   "
+                f"SSE delivery p50 {sse_p50:5.0f} ms  p99 {sse_p99:5.0f} ms"
+            )
+    finally:
+        server.should_exit = True
+        server_thread.join(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# benchmarks/bench_persist.py
+"""
+Time to persist a playlist of synthetic videos: one ORM object and flush per
+row (the old write loop) versus the bulk upserts behind store_playlist().
+
+    python -m benchmarks.bench_persist [--videos 10000]
+"""
+import argparse
+import datetime
+import time
+
+from benchmarks.scratch import use_scratch_database
+
+use_scratch_database()
+
+from sqlalchemy.exc import IntegrityError  # noqa: E402
+
+from database import (  # noqa: E402
+    PlaylistItem,
+    Video,
+    bulk_upsert_playlist_items,
+    bulk_upsert_videos,
+    get_session,
+)
+from utils_playlist import VIDEO_COLUMNS, db_engine, store_playlist  # noqa: E402
+
+
+def synthetic_videos(playlist_id, count, views_offset=0):
+    upload_date = datetime.datetime(2024, 1, 1)
+    return [
+        {
+            "id": f"{playlist_id}v{i}",
+            "title": f"Synthetic video {i}",
+            "channel_name": f"Channel {i % 50}",
+            "upload_date": upload_date,
+            "duration": 3.0 + i % 40,
+            "views": 1000 + i * 37 % 100003 + views_offset,
+            "likes": i * 13 % 1009,
+            "like_percentage": (i * 13 % 1009) / (1000 + i * 37 % 100003) * 100,
+            "url": f"https://www.youtube.com/watch?v={playlist_id}v{i}",
+            "position": i,
+            "is_top": i % 9 == 0,
+            "fetched": True,
+        }
+        for i in range(count)
+    ]
+
+
+def persist_per_row(playlist_id, videos):
+    """One Video and PlaylistItem per row, flushed one at a time to catch duplicates"""
+    session = get_session(db_engine)
+    try:
+        now = datetime.datetime.now()
+        for video in videos:
+            session.add(
+                Video(
+                    **{column: video[column] for column in VIDEO_COLUMNS},
+                    stats_updated_at=now,
+                )
+            )
+            session.add(
+                PlaylistItem(
+                    playlist_id=playlist_id,
+                    video_id=video["id"],
+                    position=video["position"],
+                    is_top=video["is_top"],
+                )
+            )
+            try:
+                session.flush()
+            except IntegrityError:
+                session.rollback()
+        session.commit()
+    finally:
+        session.close()
+
+
+def persist_bulk_upserts(playlist_id, videos):
+    """Only the two executemany upserts, without history and aggregates"""
+    session = get_session(db_engine)
+    try:
+        now = datetime.datetime.now()
+        bulk_upsert_videos(
+            session,
+            [
+                {
+                    **{column: video[column] for column in VIDEO_COLUMNS},
+                    "stats_updated_at": now,
+                }
+                for video in videos
+            ],
+        )
+        bulk_upsert_playlist_items(
+            session,
+            [
+                {
+                    "playlist_id": playlist_id,
+                    "video_id": video["id"],
+                    "position": video["position"],
+                    "is_top": video["is_top"],
+                }
+                for video in videos
+            ],
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def persist_store_playlist(playlist_id, videos):
+    """The whole refresh write: upserts, stats history and playlist aggregates"""
+    store_playlist(
+        {
+            "id": playlist_id,
+            "title": f"Benchmark {playlist_id}",
+            "channel_name": "Benchmark",
+            "video_count": len(videos),
+            "url": f"https://www.youtube.com/playlist?list={playlist_id}",
+        },
+        videos,
+    )
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--videos", type=int, default=10_000)
+    args = parser.parse_args()
+
+    for name, persist in (
+        ("per-row flush", persist_per_row),
+        ("bulk upserts", persist_bulk_upserts),
+        ("store_playlist", persist_store_playlist),
+    ):
+        playlist_id = "PLbench" + name.replace(" ", "").replace("-", "")
+        insert = timed(persist, playlist_id, synthetic_videos(playlist_id, args.videos))
+        if persist is persist_per_row:
+            print(f"{name:15} insert {args.videos} videos  {insert:6.2f} s")
+            continue
+        # A refresh where every video's stats changed
+        update = timed(
+            persist, playlist_id, synthetic_videos(playlist_id, args.videos, 1)
+        )
+        print(
+            f"{name:15} insert {args.videos} videos  {insert:6.2f} s   "
+            f"update all  {update:6.2f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/bench_search.py
+"""
+Full-text search over a synthetic corpus: titles of 3-6 words drawn
+Zipf-style from a 20k-word vocabulary, one of 5,000 channels per video.
+Times the first page and page 11 of search_videos() for common, mid-frequency
+and rare words, prefixes and multi-word queries.
+
+    python -m benchmarks.bench_search [--videos 1000000]
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import time
+
+from benchmarks.scratch import use_scratch_database
+
+scratch_dir = use_scratch_database()
+
+from sqlalchemy import insert, text  # noqa: E402
+
+from database import Video, get_session  # noqa: E402
+from utils_playlist import build_search_query, db_engine, search_videos  # noqa: E402
+
+VOCABULARY_SIZE = 20_000
+CHANNELS = 5_000
+INSERT_BATCH = 50_000
+
+
+def build_corpus(video_count, rng):
+    """Insert the synthetic videos through the FTS triggers; returns the vocabulary"""
+    alphabet = "abcdefghijklmnopqrstuvwxyz"
+    words = [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(3, 9)))
+        for _ in range(VOCABULARY_SIZE)
+    ]
+    weights = [1 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+    now = datetime.datetime.now()
+
+    session = get_session(db_engine)
+    try:
+        for start in range(0, video_count, INSERT_BATCH):
+            count = min(INSERT_BATCH, video_count - start)
+            title_words = iter(rng.choices(words, weights, k=count * 6))
+            session.execute(
+                insert(Video),
+                [
+                    {
+                        "id": f"v{i}",
+                        "title": " ".join(
+                            next(title_words) for _ in range(rng.randint(3, 6))
+                        ),
+                        "channel_name": f"channel {i % CHANNELS}",
+                        "upload_date": now,
+                        "duration": 3.0,
+                        "views": i,
+                        "likes": 0,
+                        "like_percentage": 0.0,
+                        "url": f"https://www.youtube.com/watch?v=v{i}",
+                        "stats_updated_at": now,
+                    }
+                    for i in range(start, start + count)
+                ],
+            )
+            session.commit()
+    finally:
+        session.close()
+    return words
+
+
+def match_count(query):
+    with db_engine.connect() as connection:
+        return connection.execute(
+            text("SELECT count(*) FROM videos_fts WHERE videos_fts MATCH :match"),
+            {"match": build_search_query(query)},
+        ).scalar()
+
+
+async def time_search(query, offset, repeat):
+    await search_videos(query, offset=offset)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await search_videos(query, offset=offset)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+async def run_queries(queries, repeat):
+    for query in queries:
+        first_page = await time_search(query, 0, repeat)
+        page_11 = await time_search(query, 200, repeat)
+        print(
+            f"{query!r:24} {match_count(query):>9} matches  "
+            f"first page {first_page:8.1f} ms  page 11 {page_11:8.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--videos", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per query")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    start = time.perf_counter()
+    words = build_corpus(args.videos, rng)
+    database_size = sum(
+        os.path.getsize(os.path.join(scratch_dir, name))
+        for name in os.listdir(scratch_dir)
+    )
+    print(
+        f"inserted {args.videos} videos in {time.perf_counter() - start:.0f} s, "
+        f"database {database_size / 2**20:.0f} MiB"
+    )
+
+    common, mid, rare = words[0], words[300], words[15_000]
+    queries = [
+        common,
+        mid,
+        rare,
+        common[:2],
+        mid[:3],
+        f"{common} {mid}",
+        f"{mid} {rare[:3]}",
+        "channel 42",
+        "zzzzqx",
+    ]
+    asyncio.run(run_queries(queries, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
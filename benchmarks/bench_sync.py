@@ -0,0 +1,193 @@
+# benchmarks/bench_sync.py
+"""
+Sync throughput against a local stand-in for the remote API: a
+ThreadingHTTPServer that reads each request body, waits a fixed latency and
+answers 200, or 503 for a given share of requests. Runs
+send_playlists_to_api_sync() over the stored playlists for a few
+SYNC_CONCURRENCY / SYNC_BATCH_SIZE settings and prints playlists per second.
+
+    python -m benchmarks.bench_sync [--playlists 200] [--latency 0.02]
+        [--failure-rate 0.05]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.scratch import use_scratch_database
+
+use_scratch_database()
+# Short backoff so injected failures cost retries rather than idle seconds
+os.environ.setdefault("SYNC_RETRY_BACKOFF", "0.05")
+
+from sqlalchemy import insert  # noqa: E402
+
+import utils_sync  # noqa: E402
+from database import Playlist, PlaylistItem, bulk_upsert_videos, get_session  # noqa: E402
+from utils_playlist import db_engine  # noqa: E402
+from utils_sync import SyncManager, send_playlists_to_api_sync  # noqa: E402
+
+VIDEOS_PER_PLAYLIST = 100
+SETTINGS = [(1, 1), (4, 1), (8, 1), (4, 10), (8, 10)]  # (concurrency, batch size)
+
+
+def seed(playlist_count):
+    now = datetime.datetime.now()
+    session = get_session(db_engine)
+    try:
+        session.execute(
+            insert(Playlist),
+            [
+                {
+                    "id": f"PL{p}",
+                    "title": f"Playlist {p}",
+                    "channel_name": "Benchmark",
+                    "video_count": VIDEOS_PER_PLAYLIST,
+                    "url": f"https://www.youtube.com/playlist?list=PL{p}",
+                    "last_updated": now,
+                    "last_analyzed": now,
+                }
+                for p in range(playlist_count)
+            ],
+        )
+        bulk_upsert_videos(
+            session,
+            [
+                {
+                    "id": f"v{p}_{i}",
+                    "title": f"Video {i} of playlist {p}",
+                    "channel_name": "Benchmark",
+                    "upload_date": now,
+                    "duration": 3.0,
+                    "views": 1000 + i,
+                    "likes": i,
+                    "like_percentage": i / (1000 + i) * 100,
+                    "url": f"https://www.youtube.com/watch?v=v{p}_{i}",
+                    "stats_updated_at": now,
+                }
+                for p in range(playlist_count)
+                for i in range(VIDEOS_PER_PLAYLIST)
+            ],
+        )
+        session.execute(
+            insert(PlaylistItem),
+            [
+                {
+                    "playlist_id": f"PL{p}",
+                    "video_id": f"v{p}_{i}",
+                    "position": i,
+                    "is_top": i % 9 == 0,
+                }
+                for p in range(playlist_count)
+                for i in range(VIDEOS_PER_PLAYLIST)
+            ],
+        )
+        session.commit()
+    finally:
+        session.close()
+    return [f"PL{p}" for p in range(playlist_count)]
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency, failure_rate):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(1)
+        self.counts = {"requests": 0, "failures": 0}
+        self.lock = threading.Lock()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so the sync session's pooled connections are reused
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self._read_body()
+        server = self.server
+        with server.lock:
+            server.counts["requests"] += 1
+            failed = server.random.random() < server.failure_rate
+            if failed:
+                server.counts["failures"] += 1
+        time.sleep(server.latency)
+        self.send_response(503 if failed else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                self.rfile.read(size + 2)  # chunk and its CRLF
+                if size == 0:
+                    return
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_sync(sync_manager, playlist_ids, concurrency, batch_size):
+    utils_sync.SYNC_CONCURRENCY = concurrency
+    utils_sync.SYNC_BATCH_SIZE = batch_size
+    # The shared HTTP session sizes its connection pool from SYNC_CONCURRENCY
+    utils_sync._sync_http_session = None
+    task_id = sync_manager.create_sync_task(len(playlist_ids), target="bench")
+    start = time.perf_counter()
+    # Keep the per-playlist log lines out of the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        send_playlists_to_api_sync(task_id, playlist_ids, sync_manager)
+    elapsed = time.perf_counter() - start
+    return elapsed, sync_manager.get_sync_task(task_id).status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--playlists", type=int, default=200)
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="seconds per request"
+    )
+    parser.add_argument(
+        "--failure-rate", type=float, default=0.05, help="share of requests answered 503"
+    )
+    args = parser.parse_args()
+
+    playlist_ids = seed(args.playlists)
+    sync_manager = SyncManager(db_engine)
+    print(
+        f"{args.playlists} playlists of {VIDEOS_PER_PLAYLIST} videos, "
+        f"latency {args.latency * 1000:.0f} ms per request, "
+        f"SYNC_RETRY_BACKOFF={utils_sync.SYNC_RETRY_BACKOFF:g} s"
+    )
+    for failure_rate in sorted({0.0, args.failure_rate}):
+        server = StandInServer(args.latency, failure_rate)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        os.environ["SYNC_TARGETS"] = f"bench=http://127.0.0.1:{server.server_port}/"
+        try:
+            for concurrency, batch_size in SETTINGS:
+                server.counts.update(requests=0, failures=0)
+                elapsed, status = run_sync(
+                    sync_manager, playlist_ids, concurrency, batch_size
+                )
+                print(
+                    f"503s {failure_rate:4.0%}  concurrency {concurrency:2}  "
+                    f"batch {batch_size:3}  {args.playlists / elapsed:7.1f} playlists/s  "
+                    f"{server.counts['requests']:4} requests  "
+                    f"{server.counts['failures']:3} failed  {status}"
+                )
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
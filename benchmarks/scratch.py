@@ -0,0 +1,17 @@
+# benchmarks/scratch.py
+import atexit
+import os
+import shutil
+import tempfile
+
+
+def use_scratch_database():
+    """
+    Point the app at a throwaway database, removed at exit. Call it before
+    importing any app module: they open the database on import.
+    """
+    scratch_dir = tempfile.mkdtemp(prefix="playleast-bench-")
+    atexit.register(shutil.rmtree, scratch_dir, ignore_errors=True)
+    os.environ["DATABASE_URL"] = f"sqlite:///{scratch_dir}/youtube_playlists.db"
+    os.environ["YOUTUBE_TOKEN_FILE"] = os.path.join(scratch_dir, "token.json")
+    return scratch_dir
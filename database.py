@@ -1,5 +1,7 @@
 # database.py
+import os
 import datetime
+import threading
 from sqlalchemy import (
     Column,
     Integer,
@@ -11,13 +13,33 @@ from sqlalchemy import (
     DateTime,
     Index,
     Text,
+    event,
+    inspect,
+    text,
 )
 from sqlalchemy.sql import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///youtube_playlists.db")
+
+# Connection settings applied to every SQLite connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+# Pooled connections; WAL lets the readers run next to the single writer
+SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", 8))
+SQLITE_MAX_OVERFLOW = int(os.environ.get("SQLITE_MAX_OVERFLOW", 8))
+
 Base = declarative_base()
 
+# One engine and session factory per database URL, shared by the whole process
+_engines = {}
+_session_factories = {}
+_engines_lock = threading.Lock()
+
 
 class Playlist(Base):
     __tablename__ = "playlists"
@@ -28,15 +50,21 @@ class Playlist(Base):
     last_updated = Column(DateTime, default=func.now())
     last_analyzed = Column(DateTime, default=func.now())
     url = Column(String)
-    videos = relationship(
-        "Video", back_populates="playlist", cascade="all, delete-orphan"
+    items = relationship(
+        "PlaylistItem",
+        back_populates="playlist",
+        cascade="all, delete-orphan",
+        order_by="PlaylistItem.position",
     )
 
+    __table_args__ = (Index("idx_playlist_last_updated", "last_updated", "id"),)
+
 
 class Video(Base):
+    """A video's details and stats, shared by every playlist that contains it."""
+
     __tablename__ = "videos"
     id = Column(String, primary_key=True)
-    playlist_id = Column(String, ForeignKey("playlists.id"))
     title = Column(String)
     channel_name = Column(String)
     upload_date = Column(DateTime)
@@ -45,35 +73,314 @@ class Video(Base):
     likes = Column(Integer)
     like_percentage = Column(Float)
     url = Column(String)
-    is_top = Column(Boolean, default=False)
+    stats_updated_at = Column(DateTime)  # when the stats were last fetched
+    items = relationship("PlaylistItem", back_populates="video")
+
+
+class PlaylistItem(Base):
+    """A video's place in a playlist."""
+
+    __tablename__ = "playlist_items"
+    playlist_id = Column(String, ForeignKey("playlists.id"), primary_key=True)
+    video_id = Column(String, ForeignKey("videos.id"), primary_key=True)
     position = Column(Integer)
-    __table_args__ = (Index("idx_playlist_position", "playlist_id", "position"),)
-    playlist = relationship("Playlist", back_populates="videos")
+    is_top = Column(Boolean, default=False)
+    __table_args__ = (
+        Index("idx_playlist_item_position", "playlist_id", "position"),
+        Index("idx_playlist_item_video", "video_id"),
+    )
+    playlist = relationship("Playlist", back_populates="items")
+    video = relationship("Video", back_populates="items")
+
+
+class VideoStat(Base):
+    """Append-only history of a video's stats, one row per refresh."""
+
+    __tablename__ = "video_stats"
+    video_id = Column(String, primary_key=True)
+    captured_at = Column(Integer, primary_key=True)  # unix time in seconds
+    views = Column(Integer)
+    likes = Column(Integer)
+    # Rows are clustered by (video_id, captured_at), so a video's history is one range scan
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+class PlaylistStat(Base):
+    """Append-only history of a playlist's totals, one row per refresh."""
+
+    __tablename__ = "playlist_stats_history"
+    playlist_id = Column(String, primary_key=True)
+    captured_at = Column(Integer, primary_key=True)  # unix time in seconds
+    views = Column(Integer)
+    likes = Column(Integer)
+    video_count = Column(Integer)
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+class PlaylistAggregate(Base):
+    """
+    A playlist's current totals and view distribution, recomputed in the same
+    transaction as every write to its items or their videos.
+    """
+
+    __tablename__ = "playlist_stats"
+    playlist_id = Column(String, ForeignKey("playlists.id"), primary_key=True)
+    video_count = Column(Integer, default=0)
+    top_count = Column(Integer, default=0)
+    total_duration = Column(Float, default=0)  # in minutes
+    avg_duration = Column(Float, default=0)
+    total_views = Column(Integer, default=0)
+    total_likes = Column(Integer, default=0)
+    views_p25 = Column(Float, default=0)
+    views_median = Column(Float, default=0)
+    views_p75 = Column(Float, default=0)
+    views_p90 = Column(Float, default=0)
+    newest_upload = Column(DateTime)
+    updated_at = Column(DateTime)
 
 
 class SyncTask(Base):
     __tablename__ = "sync_tasks"
     id = Column(Integer, primary_key=True, autoincrement=True)
     status = Column(
-        String, default="started"
-    )  # started, inprogress, completed, failed, aborted
+        String, default="queued"
+    )  # queued, started, inprogress, completed, failed, aborted
     started_at = Column(DateTime, default=func.now())
     completed_at = Column(DateTime)
     total_playlists = Column(Integer, default=0)
     processed_playlists = Column(Integer, default=0)
     error_message = Column(Text)
+    target = Column(String)  # name of the sync target the task sends to
+    priority = Column(Integer, default=0)
 
     __table_args__ = (Index("idx_sync_status", "status"),)
 
 
-def init_db(db_path="sqlite:///youtube_playlists.db"):
-    """Initialize the database and create tables if they don't exist."""
-    engine = create_engine(db_path)
-    Base.metadata.create_all(engine, checkfirst=True)
-    return engine
+class SyncItem(Base):
+    __tablename__ = "sync_items"
+    task_id = Column(Integer, ForeignKey("sync_tasks.id"), primary_key=True)
+    playlist_id = Column(String, primary_key=True)
+    status = Column(String, default="pending")  # pending, sent, skipped, failed
+    attempts = Column(Integer, default=0)
+    content_hash = Column(String)
+    updated_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (Index("idx_sync_item_playlist", "playlist_id", "status"),)
+
+
+def init_db(db_path=DATABASE_URL):
+    """
+    Initialize the database and create tables if they don't exist.
+    Every call with the same URL returns the same engine.
+    """
+    with _engines_lock:
+        engine = _engines.get(db_path)
+        if engine is None:
+            engine = create_engine(
+                db_path,
+                pool_size=SQLITE_POOL_SIZE,
+                max_overflow=SQLITE_MAX_OVERFLOW,
+            )
+            event.listen(engine, "connect", _set_sqlite_pragmas)
+            _migrate_playlist_items(engine)
+            Base.metadata.create_all(engine, checkfirst=True)
+            _add_missing_columns(engine)
+            _create_missing_indexes(engine)
+            _create_video_search(engine)
+            _engines[db_path] = engine
+            _session_factories[engine] = sessionmaker(bind=engine)
+        return engine
+
+
+def init_async_db(db_path=DATABASE_URL):
+    """
+    Async engine on the same database, for request handlers running on the
+    event loop. Queries go through aiosqlite's connection thread, so the loop
+    never blocks on SQLite. Every call with the same URL returns the same engine.
+    """
+    init_db(db_path)  # tables and migrations are handled by the sync engine
+    async_path = db_path.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    with _engines_lock:
+        engine = _engines.get(async_path)
+        if engine is None:
+            engine = create_async_engine(
+                async_path,
+                pool_size=SQLITE_POOL_SIZE,
+                max_overflow=SQLITE_MAX_OVERFLOW,
+            )
+            event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+            _engines[async_path] = engine
+            _session_factories[engine] = async_sessionmaker(
+                engine, expire_on_commit=False
+            )
+        return engine
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL journaling and cache settings for each new connection."""
+    cursor = dbapi_connection.cursor()
+    # Readers don't block the writer and the writer doesn't block readers;
+    # with WAL, synchronous=NORMAL only syncs at checkpoints
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    # Wait for the write lock instead of failing with "database is locked"
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    # Negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _migrate_playlist_items(engine):
+    """
+    Move databases where every video row carried a single playlist_id over to
+    the shared videos table plus playlist_items.
+    """
+    inspector = inspect(engine)
+    if "videos" not in inspector.get_table_names():
+        return
+    if "playlist_id" not in {column["name"] for column in inspector.get_columns("videos")}:
+        return
+
+    video_columns = "id, title, channel_name, upload_date, duration, views, likes, like_percentage, url"
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX IF EXISTS idx_playlist_position"))
+        connection.execute(text("ALTER TABLE videos RENAME TO videos_legacy"))
+        Base.metadata.create_all(connection, checkfirst=True)
+        connection.execute(
+            text(
+                f"INSERT INTO videos ({video_columns}, stats_updated_at) "
+                f"SELECT {video_columns}, "
+                "(SELECT last_updated FROM playlists WHERE playlists.id = videos_legacy.playlist_id) "
+                "FROM videos_legacy"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO playlist_items (playlist_id, video_id, position, is_top) "
+                "SELECT playlist_id, id, position, is_top FROM videos_legacy "
+                "WHERE playlist_id IS NOT NULL"
+            )
+        )
+        connection.execute(text("DROP TABLE videos_legacy"))
+
+
+def _add_missing_columns(engine):
+    """Add columns introduced after a table was first created."""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(engine.dialect)
+                    connection.execute(
+                        text(
+                            f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                        )
+                    )
+
+
+def _create_missing_indexes(engine):
+    """Create indexes added to existing tables after they were first created."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+# FTS5 index over video titles and channel names. It is an external content
+# table: it keeps only the index and reads the text back from `videos` by rowid,
+# and the triggers keep it in step with every insert, upsert and delete.
+# `videos` has no INTEGER PRIMARY KEY, so a VACUUM may renumber its rowids;
+# run INSERT INTO videos_fts(videos_fts) VALUES ('rebuild') after one.
+VIDEO_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE videos_fts USING fts5("
+    "title, channel_name, content='videos', content_rowid='rowid', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')",
+    # Title matches count ten times as much as channel name matches
+    "INSERT INTO videos_fts(videos_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+    "CREATE TRIGGER videos_fts_insert AFTER INSERT ON videos BEGIN "
+    "INSERT INTO videos_fts(rowid, title, channel_name) "
+    "VALUES (new.rowid, new.title, new.channel_name); END",
+    "CREATE TRIGGER videos_fts_delete AFTER DELETE ON videos BEGIN "
+    "INSERT INTO videos_fts(videos_fts, rowid, title, channel_name) "
+    "VALUES ('delete', old.rowid, old.title, old.channel_name); END",
+    # Stats refreshes rewrite every column; only reindex when the text changed
+    "CREATE TRIGGER videos_fts_update AFTER UPDATE OF title, channel_name ON videos "
+    "WHEN old.title IS NOT new.title OR old.channel_name IS NOT new.channel_name BEGIN "
+    "INSERT INTO videos_fts(videos_fts, rowid, title, channel_name) "
+    "VALUES ('delete', old.rowid, old.title, old.channel_name); "
+    "INSERT INTO videos_fts(rowid, title, channel_name) "
+    "VALUES (new.rowid, new.title, new.channel_name); END",
+)
+
+
+def _create_video_search(engine):
+    """Create the video search index and its triggers, indexing the stored videos once."""
+    if "videos_fts" in inspect(engine).get_table_names():
+        return
+    with engine.begin() as connection:
+        for statement in VIDEO_SEARCH_DDL:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO videos_fts(videos_fts) VALUES ('rebuild')"))
+
+
+def get_async_session(engine):
+    """Open a new AsyncSession on an engine from init_async_db()."""
+    return _session_factories[engine]()
 
 
 def get_session(engine):
-    """Create a session factory for the given engine."""
-    Session = sessionmaker(bind=engine)
+    """Open a new session on the engine, using its shared session factory."""
+    Session = _session_factories.get(engine)
+    if Session is None:
+        Session = _session_factories.setdefault(engine, sessionmaker(bind=engine))
     return Session()
+
+
+def bulk_upsert_videos(session, rows):
+    """Insert or update video rows with a single executemany INSERT ... ON CONFLICT."""
+    if not rows:
+        return
+    stmt = sqlite_insert(Video)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Video.id],
+        set_={column: stmt.excluded[column] for column in rows[0] if column != "id"},
+    )
+    session.execute(stmt, rows)
+
+
+def bulk_insert_stats(session, model, rows):
+    """Append stats snapshots, ignoring ones already recorded for the same second."""
+    if not rows:
+        return
+    session.execute(sqlite_insert(model).on_conflict_do_nothing(), rows)
+
+
+def bulk_upsert_playlist_aggregates(session, rows):
+    """Replace playlist_stats rows with a single executemany INSERT ... ON CONFLICT."""
+    if not rows:
+        return
+    stmt = sqlite_insert(PlaylistAggregate)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PlaylistAggregate.playlist_id],
+        set_={column: stmt.excluded[column] for column in rows[0] if column != "playlist_id"},
+    )
+    session.execute(stmt, rows)
+
+
+def bulk_upsert_playlist_items(session, rows):
+    """Insert or update playlist_items rows with a single executemany INSERT ... ON CONFLICT."""
+    if not rows:
+        return
+    stmt = sqlite_insert(PlaylistItem)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PlaylistItem.playlist_id, PlaylistItem.video_id],
+        set_={
+            column: stmt.excluded[column]
+            for column in rows[0]
+            if column not in ("playlist_id", "video_id")
+        },
+    )
+    session.execute(stmt, rows)
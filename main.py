@@ -1,10 +1,31 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 
 from views import router as sync_router
+from utils_playlist import backfill_playlist_aggregates
+from utils_refresh import AUTO_REFRESH_ENABLED, AutoRefresher, ViewFlusher
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Playlists stored before playlist_stats existed get their aggregates once
+    backfill_playlist_aggregates()
+    # Views answered from the page cache still order the auto refreshes
+    view_flusher = ViewFlusher()
+    view_flusher.start()
+    # Keep stored playlists fresh so page views are served from the database
+    auto_refresher = AutoRefresher()
+    if AUTO_REFRESH_ENABLED:
+        auto_refresher.start()
+    yield
+    auto_refresher.stop(timeout=5)
+    view_flusher.stop(timeout=5)
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 templates = Jinja2Templates(directory="templates")
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -0,0 +1,22 @@
+# rescore.py
+import os
+import argparse
+
+from utils_playlist import rescore_playlists
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recompute top videos for stored playlists without calling the YouTube API."
+    )
+    parser.add_argument(
+        "playlist_ids", nargs="*", help="Playlists to rescore (default: all)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of scoring processes",
+    )
+    args = parser.parse_args()
+
+    rescore_playlists(args.playlist_ids or None, workers=args.workers)
@@ -0,0 +1,29 @@
+# tests/conftest.py
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# The app modules open the database and read their settings on import,
+# so point them at a scratch directory before any test imports them
+_scratch_dir = tempfile.mkdtemp(prefix="playleast-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_scratch_dir}/youtube_playlists.db"
+os.environ["YOUTUBE_TOKEN_FILE"] = os.path.join(_scratch_dir, "token.json")
+os.environ["AUTO_REFRESH_ENABLED"] = "0"
+
+from tests.youtube_stub import StubYouTube  # noqa: E402
+
+
+@pytest.fixture
+def youtube(monkeypatch):
+    """A StubYouTube handed out wherever the app asks for the YouTube client"""
+    import utils_playlist
+
+    stub = StubYouTube()
+    monkeypatch.setattr(utils_playlist, "get_authenticated_service", lambda: stub)
+    return stub
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_scratch_dir, ignore_errors=True)
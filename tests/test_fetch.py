@@ -0,0 +1,117 @@
+# tests/test_fetch.py
+import threading
+
+import google.oauth2.credentials
+
+import utils_playlist
+from database import VideoStat, get_session
+from utils_playlist import analyze_playlists, db_engine, get_or_analyze_playlist
+
+
+def test_recent_stats_are_reused(youtube):
+    playlist_id = youtube.add_playlist(200)
+    get_or_analyze_playlist(playlist_id)
+    youtube.fetched_video_ids.clear()
+
+    # A second playlist with the same videos only pages through its items
+    other_id = youtube.add_playlist(0, video_ids=youtube.video_ids(playlist_id))
+    get_or_analyze_playlist(other_id)
+
+    assert youtube.fetched_video_ids == []
+
+
+def test_force_refresh_fetches_every_video(youtube):
+    playlist_id = youtube.add_playlist(200)
+    get_or_analyze_playlist(playlist_id)
+    youtube.fetched_video_ids.clear()
+    youtube.extra_views = 500
+
+    result = get_or_analyze_playlist(playlist_id, force_refresh=True)
+
+    assert sorted(youtube.fetched_video_ids) == sorted(youtube.video_ids(playlist_id))
+    assert not result["from_cache"]
+    assert [video["views"] for video in result["all_videos"]] == [
+        youtube.view_count(video_id) for video_id in youtube.video_ids(playlist_id)
+    ]
+
+
+def test_batch_force_refresh_fetches_every_video(youtube):
+    playlist_ids = [youtube.add_playlist(60), youtube.add_playlist(40)]
+    list(analyze_playlists(playlist_ids))
+    youtube.fetched_video_ids.clear()
+
+    list(analyze_playlists(playlist_ids, force_refresh=True))
+
+    assert sorted(youtube.fetched_video_ids) == sorted(
+        youtube.video_ids(playlist_ids[0]) + youtube.video_ids(playlist_ids[1])
+    )
+
+
+def _video_stats(playlist_id, youtube, shift=0):
+    """Count the playlist's stats snapshots, moving them `shift` seconds back first"""
+    session = get_session(db_engine)
+    try:
+        snapshots = session.query(VideoStat).filter(
+            VideoStat.video_id.in_(youtube.video_ids(playlist_id))
+        )
+        if shift:
+            snapshots.update(
+                {VideoStat.captured_at: VideoStat.captured_at - shift},
+                synchronize_session=False,
+            )
+            session.commit()
+        return snapshots.count()
+    finally:
+        session.close()
+
+
+def test_force_refresh_counts_changed_stats(youtube):
+    playlist_id = youtube.add_playlist(120)
+    get_or_analyze_playlist(playlist_id)
+    # Keep the refresh's snapshots from landing in the same second
+    _video_stats(playlist_id, youtube, shift=60)
+    youtube.extra_views = 500
+
+    result = get_or_analyze_playlist(playlist_id, force_refresh=True)
+
+    assert result["changes"] == {
+        "inserted": 0,
+        "updated": 120,
+        "deleted": 0,
+        "playlists": [playlist_id],
+    }
+    assert _video_stats(playlist_id, youtube) == 240
+
+
+def test_force_refresh_without_changes_writes_no_stats(youtube):
+    playlist_id = youtube.add_playlist(120)
+    get_or_analyze_playlist(playlist_id)
+    # Keep the refresh's snapshots from landing in the same second
+    _video_stats(playlist_id, youtube, shift=60)
+
+    result = get_or_analyze_playlist(playlist_id, force_refresh=True)
+
+    assert result["changes"]["updated"] == 0
+    assert _video_stats(playlist_id, youtube) == 120
+
+
+def test_requests_reuse_their_threads_connection(monkeypatch):
+    monkeypatch.setattr(utils_playlist, "_youtube_service", None)
+    monkeypatch.setattr(utils_playlist, "_youtube_http", threading.local())
+    monkeypatch.setattr(
+        utils_playlist,
+        "_load_credentials",
+        lambda: google.oauth2.credentials.Credentials("token"),
+    )
+    youtube = utils_playlist.get_authenticated_service()
+    first = youtube.videos().list(part="statistics", id="a")
+    second = youtube.playlistItems().list(part="contentDetails", playlistId="PL")
+    other_thread = []
+    thread = threading.Thread(
+        target=lambda: other_thread.append(youtube.videos().list(part="id", id="b"))
+    )
+    thread.start()
+    thread.join()
+
+    assert first.http is second.http
+    assert other_thread[0].http is not first.http
@@ -0,0 +1,105 @@
+# tests/test_ranking.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils_ranking import score_playlists, top_video_mask
+
+RANDOM_BATCHES = 300
+
+
+def reference_is_top(views, like_percentage, total_video_count):
+    """
+    The pandas top-video selection utils_ranking replaced, kept verbatim as
+    the reference its output must match.
+    """
+    df = pd.DataFrame({"views": views, "like_percentage": like_percentage})
+    TOP_N_PERCENT = 11 / 100
+
+    df["views_normalized"] = (
+        df["views"] / df["views"].max() if df["views"].max() > 0 else 0
+    )
+    df["like_percentage_normalized"] = df["like_percentage"] / 100
+    df["views_rank"] = df["views"].rank(pct=True)
+    df["likes_rank"] = df["like_percentage"].rank(pct=True)
+    df["above_median_views"] = df["views_rank"] >= 0.5
+    df["above_median_likes"] = df["likes_rank"] >= 0.5
+    df["combined_score"] = df["views_normalized"] * df["like_percentage_normalized"]
+    df_candidates = df[df["above_median_views"] & df["above_median_likes"]]
+
+    if len(df_candidates) > 0:
+        TOP_N_COUNT = len(df) * TOP_N_PERCENT
+        if total_video_count > 5 and TOP_N_COUNT < 5:
+            TOP_N_COUNT = total_video_count // 2
+        else:
+            TOP_N_COUNT = total_video_count - 2
+
+        top_count = max(1, int(TOP_N_COUNT))
+        top_threshold = df_candidates["combined_score"].nlargest(top_count).min()
+        df["is_top"] = (
+            (df["combined_score"] >= top_threshold)
+            & df["above_median_views"]
+            & df["above_median_likes"]
+        )
+    else:
+        df["is_top"] = False
+
+    return df["is_top"].to_numpy(dtype=bool)
+
+
+def _random_playlist(rng):
+    length = int(rng.choice([1, 2, 3, 5, 8, 20, 45, 60, 200]))
+    if rng.random() < 0.3:
+        # Few distinct values, so ranks are full of ties
+        views = rng.integers(0, 4, length) * 1000
+        like_percentage = rng.integers(0, 3, length) * 1.5
+    else:
+        views = rng.integers(0, 10_000_000, length)
+        likes = (views * rng.random(length) * 0.1).astype(np.int64)
+        like_percentage = np.divide(
+            likes * 100, views, out=np.zeros(length), where=views > 0
+        )
+    if rng.random() < 0.05:
+        views = np.zeros(length, dtype=np.int64)
+    # The reported count can differ from the videos actually returned
+    total_video_count = max(0, length + int(rng.integers(-3, 10)))
+    return views, like_percentage, total_video_count
+
+
+def test_batches_match_reference():
+    rng = np.random.default_rng(20240501)
+    for _ in range(RANDOM_BATCHES):
+        playlists = [_random_playlist(rng) for _ in range(int(rng.integers(1, 6)))]
+
+        is_top = score_playlists(
+            np.concatenate([views for views, _, _ in playlists]),
+            np.concatenate([likes for _, likes, _ in playlists]),
+            [len(views) for views, _, _ in playlists],
+            [count for _, _, count in playlists],
+        )
+
+        expected = np.concatenate(
+            [reference_is_top(*playlist) for playlist in playlists]
+        )
+        np.testing.assert_array_equal(is_top, expected)
+
+
+@pytest.mark.parametrize(
+    "views, like_percentage, total_video_count",
+    [
+        ([100], [5.0], 1),
+        ([0, 0, 0], [0.0, 0.0, 0.0], 3),
+        ([10, 10, 10, 10], [1.0, 1.0, 1.0, 1.0], 4),
+        ([5, 50, 500, 5000, 50000, 500000, 5000000], [9, 8, 7, 6, 5, 4, 3], 7),
+        (list(range(100)), [i % 7 for i in range(100)], 120),
+    ],
+)
+def test_single_playlist_matches_reference(views, like_percentage, total_video_count):
+    np.testing.assert_array_equal(
+        top_video_mask(views, like_percentage, total_video_count),
+        reference_is_top(views, like_percentage, total_video_count),
+    )
+
+
+def test_empty_batch():
+    assert score_playlists([], [], [], []).shape == (0,)
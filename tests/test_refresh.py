@@ -0,0 +1,75 @@
+# tests/test_refresh.py
+import time
+
+from database import Playlist, get_session
+from utils_playlist import db_engine, get_stored_playlist, mark_viewed
+from utils_refresh import ViewFlusher, refresh_playlist
+
+
+def _last_analyzed(playlist_id):
+    session = get_session(db_engine)
+    try:
+        return session.get(Playlist, playlist_id).last_analyzed
+    finally:
+        session.close()
+
+
+def test_refresh_playlist_fetches_and_stores(youtube):
+    playlist_id = youtube.add_playlist(120)
+
+    result = refresh_playlist(playlist_id).result(timeout=30)
+
+    assert "error" not in result
+    assert result["playlist_info"]["id"] == playlist_id
+    assert [video["position"] for video in result["all_videos"]] == list(range(120))
+    assert youtube.calls["videos"] == 3
+
+    stored = get_stored_playlist(playlist_id)
+    assert stored["from_cache"]
+    assert len(stored["all_videos"]) == 120
+    assert [video["url"] for video in stored["top_videos"]] == [
+        video["url"] for video in result["top_videos"]
+    ]
+
+
+def test_refresh_playlist_without_marking_analyzed(youtube):
+    playlist_id = youtube.add_playlist(10)
+    first = refresh_playlist(playlist_id).result(timeout=30)
+
+    second = refresh_playlist(playlist_id, mark_analyzed=False).result(timeout=30)
+
+    assert "error" not in second
+    assert (
+        second["playlist_info"]["last_analyzed"]
+        == first["playlist_info"]["last_analyzed"]
+    )
+
+
+def test_view_flusher_writes_cached_views(youtube):
+    playlist_id = youtube.add_playlist(5)
+    refresh_playlist(playlist_id).result(timeout=30)
+    before = _last_analyzed(playlist_id)
+
+    flusher = ViewFlusher(interval=0.05)
+    flusher.start()
+    try:
+        mark_viewed(playlist_id)
+        deadline = time.monotonic() + 5
+        while _last_analyzed(playlist_id) == before:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+    finally:
+        flusher.stop(timeout=5)
+
+
+def test_view_flusher_flushes_on_stop(youtube):
+    playlist_id = youtube.add_playlist(5)
+    refresh_playlist(playlist_id).result(timeout=30)
+    before = _last_analyzed(playlist_id)
+
+    flusher = ViewFlusher(interval=3600)
+    flusher.start()
+    mark_viewed(playlist_id)
+    flusher.stop(timeout=5)
+
+    assert _last_analyzed(playlist_id) > before
@@ -0,0 +1,114 @@
+# tests/test_rescore.py
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import utils_playlist
+from database import PlaylistItem, get_session
+from utils_playlist import db_engine, get_or_analyze_playlist, rescore_playlists
+
+
+def _top_flags(playlist_id):
+    session = get_session(db_engine)
+    try:
+        return dict(
+            session.query(PlaylistItem.video_id, PlaylistItem.is_top).filter(
+                PlaylistItem.playlist_id == playlist_id
+            )
+        )
+    finally:
+        session.close()
+
+
+def _clear_top_flags(playlist_id):
+    session = get_session(db_engine)
+    try:
+        session.query(PlaylistItem).filter(
+            PlaylistItem.playlist_id == playlist_id
+        ).update({"is_top": False})
+        session.commit()
+    finally:
+        session.close()
+
+
+def _app(views):
+    app = FastAPI()
+    app.include_router(views.router)
+    return app
+
+
+def test_rescore_restores_top_flags(youtube):
+    playlist_id = youtube.add_playlist(150)
+    get_or_analyze_playlist(playlist_id)
+    expected = _top_flags(playlist_id)
+    assert any(expected.values())
+    _clear_top_flags(playlist_id)
+
+    counts = rescore_playlists([playlist_id])
+
+    assert counts["changed"] == sum(expected.values())
+    assert _top_flags(playlist_id) == expected
+
+
+def test_rescore_workers_are_spawned_and_capped(youtube, monkeypatch):
+    playlist_id = youtube.add_playlist(150)
+    get_or_analyze_playlist(playlist_id)
+    expected = _top_flags(playlist_id)
+    _clear_top_flags(playlist_id)
+
+    executors = []
+
+    def recording_executor(**kwargs):
+        executors.append(kwargs)
+        return ProcessPoolExecutor(**kwargs)
+
+    monkeypatch.setattr(utils_playlist.os, "cpu_count", lambda: 2)
+    monkeypatch.setattr(utils_playlist, "ProcessPoolExecutor", recording_executor)
+    rescore_playlists([playlist_id], workers=64)
+
+    assert executors[0]["max_workers"] == 2
+    assert executors[0]["mp_context"].get_start_method() == "spawn"
+    assert _top_flags(playlist_id) == expected
+
+
+def test_rescore_endpoint_ignores_workers(youtube, monkeypatch):
+    import views
+
+    calls = []
+    monkeypatch.setattr(
+        views,
+        "rescore_playlists",
+        lambda *args, **kwargs: calls.append((args, kwargs)) or {},
+    )
+    response = TestClient(_app(views)).post("/rescore?workers=100000")
+
+    assert response.status_code == 200
+    assert calls == [((None,), {})]
+
+
+class OtherProcessCache:
+    """Stands in for rescore.py's own render cache, which the server never sees"""
+
+    def invalidate(self, playlist_ids):
+        pass
+
+
+def test_rescore_in_another_process_reaches_cached_pages(youtube, monkeypatch):
+    import views
+
+    playlist_id = youtube.add_playlist(150)
+    get_or_analyze_playlist(playlist_id)
+    _clear_top_flags(playlist_id)
+    client = TestClient(_app(views))
+    before = client.get(f"/playlist/{playlist_id}")
+    videos_before = client.get(f"/playlist/{playlist_id}/videos?top=true")
+    assert client.get(f"/playlist/{playlist_id}").headers["etag"] == before.headers["etag"]
+
+    monkeypatch.setattr(utils_playlist, "rendered_pages", OtherProcessCache())
+    rescore_playlists([playlist_id])
+
+    assert client.get(f"/playlist/{playlist_id}").headers["etag"] != before.headers["etag"]
+    videos_after = client.get(f"/playlist/{playlist_id}/videos?top=true").json()
+    assert videos_before.json()["videos"] == []
+    assert len(videos_after["videos"]) == sum(_top_flags(playlist_id).values())
@@ -0,0 +1,65 @@
+# tests/test_search.py
+import asyncio
+import datetime
+
+from database import get_session, bulk_upsert_videos
+from utils_playlist import build_search_query, db_engine, search_videos
+
+
+def _store_videos(titles, prefix):
+    now = datetime.datetime.now()
+    session = get_session(db_engine)
+    try:
+        bulk_upsert_videos(
+            session,
+            [
+                {
+                    "id": f"{prefix}{i}",
+                    "title": title,
+                    "channel_name": "Search Channel",
+                    "upload_date": now,
+                    "duration": 3.0,
+                    "views": i,
+                    "likes": 0,
+                    "like_percentage": 0.0,
+                    "url": f"https://www.youtube.com/watch?v={prefix}{i}",
+                    "stats_updated_at": now,
+                }
+                for i, title in enumerate(titles)
+            ],
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def test_build_search_query():
+    assert build_search_query('python "tut') == '"python" "tut"*'
+    assert build_search_query("  ") == ""
+
+
+def test_best_match_wins_over_earlier_matches():
+    # Weak matches stored first, the best one last: ranking must see them all
+    weak = [f"zebrafish {' '.join(['filler'] * 30)} {i}" for i in range(6000)]
+    _store_videos(weak, "weak")
+    _store_videos(["Zebrafish zebrafish"], "best")
+
+    videos, has_more = asyncio.run(search_videos("zebrafish", limit=5))
+
+    assert videos[0]["id"] == "best0"
+    assert has_more
+
+
+def test_pages_cover_every_match():
+    _store_videos([f"Okapi documentary part {i}" for i in range(45)], "okapi")
+
+    seen = []
+    offset = 0
+    while True:
+        videos, has_more = asyncio.run(search_videos("okap", limit=20, offset=offset))
+        seen.extend(video["id"] for video in videos)
+        if not has_more:
+            break
+        offset += 20
+
+    assert sorted(seen) == sorted(f"okapi{i}" for i in range(45))
@@ -0,0 +1,112 @@
+# tests/test_singleflight.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils_playlist import get_or_analyze_playlist
+from utils_refresh import get_playlist_stale_while_revalidate, refresh_playlist
+from utils_singleflight import SingleFlight
+
+CONCURRENT_REQUESTS = 8
+
+
+def _run_at_once(fn, count=CONCURRENT_REQUESTS):
+    """Call fn() from `count` threads released together; return the results"""
+    barrier = threading.Barrier(count)
+
+    def call():
+        barrier.wait()
+        return fn()
+
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        futures = [executor.submit(call) for _ in range(count)]
+        return [future.result() for future in futures]
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return object()
+
+    # The first caller blocks in work() until every other caller has joined
+    started = threading.Barrier(CONCURRENT_REQUESTS + 1)
+
+    def call():
+        started.wait()
+        return flight.do("key", work)
+
+    with ThreadPoolExecutor(max_workers=CONCURRENT_REQUESTS) as executor:
+        futures = [executor.submit(call) for _ in range(CONCURRENT_REQUESTS)]
+        started.wait()
+        time.sleep(0.1)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert not flight.in_flight("key")
+
+
+def test_single_flight_shares_exceptions():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    # A failed call is not remembered
+    assert flight.do("key", lambda: 42) == 42
+
+
+def test_concurrent_analyses_fetch_once(youtube):
+    youtube.latency = 0.05
+    playlist_id = youtube.add_playlist(120)
+
+    results = _run_at_once(
+        lambda: get_or_analyze_playlist(playlist_id, force_refresh=True)
+    )
+
+    assert youtube.calls["playlists"] == 1
+    assert youtube.calls["playlistItems"] == 3
+    assert youtube.calls["videos"] == 3
+    assert all(result is results[0] for result in results)
+
+
+def test_concurrent_refreshes_fetch_once(youtube):
+    youtube.latency = 0.05
+    playlist_id = youtube.add_playlist(120)
+
+    futures = _run_at_once(lambda: refresh_playlist(playlist_id))
+    results = [future.result(timeout=30) for future in futures]
+
+    assert youtube.calls["playlistItems"] == 3
+    assert youtube.calls["videos"] == 3
+    assert all(result is results[0] for result in results)
+
+
+def test_concurrent_page_views_fetch_once(youtube):
+    youtube.latency = 0.05
+    playlist_id = youtube.add_playlist(120)
+
+    async def view_all():
+        return await asyncio.gather(
+            *(
+                get_playlist_stale_while_revalidate(playlist_id, top_only=True)
+                for _ in range(CONCURRENT_REQUESTS)
+            )
+        )
+
+    results = asyncio.run(view_all())
+
+    assert youtube.calls["playlistItems"] == 3
+    assert youtube.calls["videos"] == 3
+    assert all("error" not in result for result in results)
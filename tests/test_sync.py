@@ -0,0 +1,37 @@
+# tests/test_sync.py
+import threading
+import time
+
+import requests
+
+import utils_sync
+
+
+class UnavailableSession:
+    """Answers every post with a 503"""
+
+    def __init__(self):
+        self.posts = 0
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.posts += 1
+        response = requests.Response()
+        response.status_code = 503
+        response.url = url
+        return response
+
+
+def test_abort_cuts_retry_backoff_short(monkeypatch):
+    monkeypatch.setattr(utils_sync, "SYNC_RETRY_BACKOFF", 30.0)
+    http = UnavailableSession()
+    abort_event = threading.Event()
+    threading.Timer(0.2, abort_event.set).start()
+
+    start = time.monotonic()
+    attempts, error = utils_sync._send_batch(
+        http, "http://sync.invalid/", [{"id": "PL1", "title": "Playlist"}], abort_event
+    )
+
+    assert time.monotonic() - start < 5
+    assert attempts == 1 and http.posts == 1
+    assert error.response.status_code == 503
@@ -0,0 +1,136 @@
+# tests/youtube_stub.py
+import collections
+import itertools
+import threading
+import time
+
+_playlist_numbers = itertools.count()
+
+
+class _Request:
+    def __init__(self, fn, kwargs):
+        self._fn = fn
+        self._kwargs = kwargs
+
+    def execute(self):
+        return self._fn(**self._kwargs)
+
+
+class _Resource:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def list(self, **kwargs):
+        return _Request(self._fn, kwargs)
+
+
+class StubYouTube:
+    """
+    In-memory stand-in for the YouTube Data API client, answering the
+    playlists, playlistItems and videos list calls the app makes.
+    Every call sleeps `latency` seconds and is counted in `calls`.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = collections.Counter()
+        self.fetched_video_ids = []
+        # Added to every view count, so a later fetch sees new stats
+        self.extra_views = 0
+        self._playlists = {}
+        self._lock = threading.Lock()
+
+    def add_playlist(self, video_count, video_ids=None, title=None):
+        """Create a playlist with unique videos (or the given ones) and return its ID"""
+        playlist_id = f"PLstub{next(_playlist_numbers)}"
+        if video_ids is None:
+            video_ids = [f"{playlist_id}v{i}" for i in range(video_count)]
+        self._playlists[playlist_id] = {
+            "title": title or f"Playlist {playlist_id}",
+            "video_ids": list(video_ids),
+        }
+        return playlist_id
+
+    def video_ids(self, playlist_id):
+        return list(self._playlists[playlist_id]["video_ids"])
+
+    def view_count(self, video_id):
+        return int(self._video_item(video_id)["statistics"]["viewCount"])
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def playlists(self):
+        return _Resource(self._list_playlists)
+
+    def playlistItems(self):
+        return _Resource(self._list_playlist_items)
+
+    def videos(self):
+        return _Resource(self._list_videos)
+
+    def _list_playlists(
+        self, part, id=None, channelId=None, maxResults=None, pageToken=None
+    ):
+        self._call("playlists")
+        playlist_ids = id.split(",") if id else list(self._playlists)
+        return {
+            "items": [
+                {
+                    "id": playlist_id,
+                    "snippet": {
+                        "title": self._playlists[playlist_id]["title"],
+                        "channelTitle": "Stub Channel",
+                    },
+                    "contentDetails": {
+                        "itemCount": len(self._playlists[playlist_id]["video_ids"])
+                    },
+                }
+                for playlist_id in playlist_ids
+                if playlist_id in self._playlists
+            ]
+        }
+
+    def _list_playlist_items(self, part, maxResults, playlistId, pageToken=None):
+        self._call("playlistItems")
+        video_ids = self._playlists[playlistId]["video_ids"]
+        start = int(pageToken or 0)
+        end = min(start + maxResults, len(video_ids))
+        response = {
+            "items": [
+                {
+                    "contentDetails": {"videoId": video_ids[position]},
+                    "snippet": {"position": position},
+                }
+                for position in range(start, end)
+            ]
+        }
+        if end < len(video_ids):
+            response["nextPageToken"] = str(end)
+        return response
+
+    def _list_videos(self, part, id):
+        self._call("videos")
+        video_ids = id.split(",")
+        with self._lock:
+            self.fetched_video_ids.extend(video_ids)
+        return {"items": [self._video_item(video_id) for video_id in video_ids]}
+
+    def _video_item(self, video_id):
+        number = sum(map(ord, video_id))
+        return {
+            "id": video_id,
+            "snippet": {
+                "title": f"Video {video_id}",
+                "channelTitle": "Stub Channel",
+                "publishedAt": "2024-01-01T00:00:00Z",
+            },
+            "contentDetails": {"duration": f"PT{3 + number % 40}M"},
+            "statistics": {
+                "viewCount": str(1000 + number * 7919 % 100003 + self.extra_views),
+                "likeCount": str(number * 104729 % 1009),
+            },
+        }
@@ -0,0 +1,129 @@
+# utils_cache.py
+import collections
+import hashlib
+import os
+import threading
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from starlette.responses import Response
+
+# Upper bound on the bytes of rendered pages and JSON kept in memory
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+
+class CachedResponse:
+    """
+    A rendered body with the validators sent along with it, and the version
+    of the playlist's stored data it was rendered from.
+    """
+
+    def __init__(self, body: bytes, media_type: str, last_modified=None, version=None):
+        self.body = body
+        self.media_type = media_type
+        self.last_modified = last_modified
+        self.version = version
+        # Strong ETag: it changes whenever a single byte of the body does
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class RenderCache:
+    """
+    LRU cache of rendered responses, bounded by the total size of their bodies.
+    Keys are tuples starting with the playlist ID, so everything cached for a
+    playlist can be dropped at once when it is refreshed or deleted.
+    invalidate() only reaches this process; writes made by other processes are
+    caught by comparing an entry's version with the database on a hit.
+    """
+
+    def __init__(self, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = collections.OrderedDict()
+        self._keys_by_playlist = collections.defaultdict(set)
+        self._generations = collections.Counter()
+        self._lock = threading.Lock()
+
+    def generation(self, playlist_id) -> int:
+        """Take before reading the data to render; put() drops results read before an invalidate()"""
+        with self._lock:
+            return self._generations[playlist_id]
+
+    def get(self, key) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry: CachedResponse, generation: int):
+        playlist_id = key[0]
+        if len(entry.body) > self.max_bytes:
+            return
+        with self._lock:
+            if self._generations[playlist_id] != generation:
+                return
+            self._remove(key)
+            self._entries[key] = entry
+            self._keys_by_playlist[playlist_id].add(key)
+            self.size += len(entry.body)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, playlist_ids):
+        with self._lock:
+            for playlist_id in playlist_ids:
+                self._generations[playlist_id] += 1
+                for key in list(self._keys_by_playlist.get(playlist_id, ())):
+                    self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= len(entry.body)
+        keys = self._keys_by_playlist[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_playlist[key[0]]
+
+
+def _not_modified(request, entry: CachedResponse) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or entry.etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and entry.last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return _http_time(entry.last_modified) <= since
+    return False
+
+
+def _http_time(timestamp):
+    # Timestamps are stored as naive local time; HTTP dates are whole seconds in GMT
+    return timestamp.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def cached_response(request, entry: CachedResponse) -> Response:
+    """Send the cached body, or 304 Not Modified when the client's copy is current"""
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if entry.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(
+            _http_time(entry.last_modified), usegmt=True
+        )
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type=entry.media_type, headers=headers)
+
+
+# Rendered playlist pages and video lists, shared by the views and the write path
+rendered_pages = RenderCache()
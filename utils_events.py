@@ -0,0 +1,108 @@
+# utils_events.py
+import asyncio
+import collections
+import json
+import threading
+from typing import Optional
+
+# Recent events kept so reconnecting clients can replay from Last-Event-ID
+EVENT_REPLAY_SIZE = 256
+# Events buffered per subscriber before the oldest ones are dropped
+SUBSCRIBER_BUFFER_SIZE = 64
+# Event types where only the latest one per task matters
+COALESCED_EVENTS = {"progress"}
+
+
+class Subscriber:
+    """Bounded event buffer of one SSE client, living on the server's event loop"""
+
+    def __init__(self, maxlen: int = SUBSCRIBER_BUFFER_SIZE):
+        self.events = collections.deque(maxlen=maxlen)
+        self.ready = asyncio.Event()
+        self.last_id = 0
+
+    def push(self, event: dict):
+        if event["id"] <= self.last_id:
+            return
+        self.last_id = event["id"]
+
+        # A newer progress event for the same task replaces the pending one
+        if event["event"] in COALESCED_EVENTS and self.events:
+            pending = self.events[-1]
+            if pending["event"] == event["event"] and pending["data"].get(
+                "task_id"
+            ) == event["data"].get("task_id"):
+                self.events[-1] = event
+                return
+
+        self.events.append(event)
+        self.ready.set()
+
+    async def get_events(self, timeout: float) -> list:
+        """Wait up to `timeout` seconds for events and take everything buffered"""
+        if not self.events:
+            self.ready.clear()
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+
+class EventHub:
+    """Fans events out to SSE subscribers on the server's own event loop"""
+
+    def __init__(self):
+        self.loop = None
+        self.subscribers = set()
+        self.history = collections.deque(maxlen=EVENT_REPLAY_SIZE)
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscriber:
+        """Register a subscriber; must be called from the server's event loop"""
+        self.loop = asyncio.get_running_loop()
+        subscriber = Subscriber()
+        with self._lock:
+            if last_event_id is not None:
+                for event in self.history:
+                    if event["id"] > last_event_id:
+                        subscriber.push(event)
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, event_type: str, data: dict):
+        """Publish an event from any thread"""
+        with self._lock:
+            event = {"id": self._next_id, "event": event_type, "data": data}
+            self._next_id += 1
+            self.history.append(event)
+
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._deliver, event)
+            except RuntimeError:
+                # Loop shut down between the check and the call
+                pass
+
+    def _deliver(self, event: dict):
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.push(event)
+
+
+def format_sse(event: dict) -> str:
+    """Serialize an event in the text/event-stream format"""
+    return (
+        f"id: {event['id']}\n"
+        f"event: {event['event']}\n"
+        f"data: {json.dumps(event['data'], default=str)}\n\n"
+    )
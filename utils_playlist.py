@@ -1,13 +1,43 @@
+import os
 import re
 import datetime
-
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import google.auth.exceptions
+import google.auth.transport.requests
+import google.oauth2.credentials
+import google_auth_httplib2
 import google_auth_oauthlib.flow
 import googleapiclient.discovery
+import googleapiclient.http
+import httplib2
 import isodate
-from sqlalchemy.exc import IntegrityError
-import pandas as pd
-
-from database import Playlist, Video, init_db, get_session
+import numpy as np
+from sqlalchemy import or_, and_, update, delete, select, literal, text, bindparam
+from sqlalchemy.orm import aliased, selectinload
+
+from database import (
+    Playlist,
+    PlaylistItem,
+    Video,
+    VideoStat,
+    PlaylistStat,
+    PlaylistAggregate,
+    init_db,
+    init_async_db,
+    get_session,
+    get_async_session,
+    bulk_upsert_videos,
+    bulk_upsert_playlist_items,
+    bulk_upsert_playlist_aggregates,
+    bulk_insert_stats,
+)
+from utils_cache import rendered_pages
+from utils_ranking import score_playlists, top_video_mask
+from utils_singleflight import SingleFlight
 
 
 # Set up API client
@@ -15,20 +45,100 @@ API_SERVICE_NAME = "youtube"
 API_VERSION = "v3"
 CLIENT_SECRETS_FILE = "client_secret.json"
 SCOPES = ["https://www.googleapis.com/auth/youtube.readonly"]
+# Authorized user credentials are kept here so the OAuth flow only runs once
+TOKEN_FILE = os.environ.get("YOUTUBE_TOKEN_FILE", "token.json")
+
+# Max number of videos.list requests in flight while paging through a playlist
+YOUTUBE_FETCH_CONCURRENCY = int(os.environ.get("YOUTUBE_FETCH_CONCURRENCY", 8))
+
+# Stored video stats younger than this (seconds) are reused instead of fetched again,
+# e.g. for videos shared with a playlist that was refreshed shortly before
+VIDEO_STATS_MAX_AGE = int(os.environ.get("VIDEO_STATS_MAX_AGE", 3600))
+
+# Playlists fetched at once by analyze_playlists()
+BATCH_ANALYZE_CONCURRENCY = int(os.environ.get("BATCH_ANALYZE_CONCURRENCY", 4))
+
+# Stored playlist data older than this (seconds) is fetched again
+PLAYLIST_MAX_AGE = int(os.environ.get("PLAYLIST_MAX_AGE", 86400))
 
 # Initialize database
 db_engine = init_db()
+# Same database for the request handlers that run on the event loop
+async_db_engine = init_async_db()
+
+
+# Playlist fetches in flight, so each playlist is fetched once at a time
+playlist_fetches = SingleFlight()
+
+
+# Process-wide YouTube client, built on first use
+_youtube_service = None
+_youtube_service_lock = threading.Lock()
+# Each thread's authorized connection for the client's requests
+_youtube_http = threading.local()
+
+
+def _load_credentials():
+    """Load saved OAuth credentials, refreshing them or running the OAuth flow as needed."""
+    credentials = None
+    if os.path.exists(TOKEN_FILE):
+        credentials = google.oauth2.credentials.Credentials.from_authorized_user_file(
+            TOKEN_FILE, SCOPES
+        )
+        if credentials.valid:
+            return credentials
+
+    if credentials and credentials.expired and credentials.refresh_token:
+        try:
+            credentials.refresh(google.auth.transport.requests.Request())
+        except google.auth.exceptions.RefreshError as e:
+            print(f"Could not refresh saved credentials: {e}")
+            credentials = None
+    else:
+        credentials = None
+
+    if credentials is None:
+        flow = google_auth_oauthlib.flow.InstalledAppFlow.from_client_secrets_file(
+            CLIENT_SECRETS_FILE, SCOPES
+        )
+        credentials = flow.run_local_server(port=8080)
+
+    with open(TOKEN_FILE, "w") as token_file:
+        token_file.write(credentials.to_json())
+    return credentials
 
 
 def get_authenticated_service():
-    """Get an authenticated YouTube API service instance."""
-    flow = google_auth_oauthlib.flow.InstalledAppFlow.from_client_secrets_file(
-        CLIENT_SECRETS_FILE, SCOPES
-    )
-    credentials = flow.run_local_server(port=8080)
-    return googleapiclient.discovery.build(
-        API_SERVICE_NAME, API_VERSION, credentials=credentials
-    )
+    """Get the authenticated YouTube API service instance, building it once per process."""
+    global _youtube_service
+
+    with _youtube_service_lock:
+        if _youtube_service is None:
+            credentials = _load_credentials()
+
+            def build_request(http, *args, **kwargs):
+                # httplib2 is not thread-safe, so every worker thread keeps its own
+                # connection, reused across its requests
+                authorized_http = getattr(_youtube_http, "authorized_http", None)
+                if authorized_http is None:
+                    authorized_http = google_auth_httplib2.AuthorizedHttp(
+                        credentials, http=httplib2.Http()
+                    )
+                    _youtube_http.authorized_http = authorized_http
+                return googleapiclient.http.HttpRequest(authorized_http, *args, **kwargs)
+
+            # The discovery document bundled with the client library is used,
+            # so building the client needs no network round trip
+            _youtube_service = googleapiclient.discovery.build(
+                API_SERVICE_NAME,
+                API_VERSION,
+                credentials=credentials,
+                requestBuilder=build_request,
+                static_discovery=True,
+                cache_discovery=False,
+            )
+
+    return _youtube_service
 
 
 def extract_playlist_id(playlist_url):
@@ -45,6 +155,29 @@ def extract_playlist_id(playlist_url):
         return playlist_url
 
 
+def extract_channel_id(channel_url):
+    """Extract channel ID from a /channel/ URL or return the ID if it's already extracted."""
+    if channel_url.startswith("http"):
+        match = re.search(r"/channel/([a-zA-Z0-9_-]+)", channel_url)
+        if match:
+            return match.group(1)
+        else:
+            raise ValueError("Could not extract channel ID from URL")
+    else:
+        return channel_url
+
+
+def _parse_playlist_item(item):
+    """Convert a playlists.list item into the playlist info dict."""
+    return {
+        "id": item["id"],
+        "title": item["snippet"]["title"],
+        "channel_name": item["snippet"]["channelTitle"],
+        "video_count": item["contentDetails"]["itemCount"],
+        "url": f"https://www.youtube.com/playlist?list={item['id']}",
+    }
+
+
 def get_playlist_info(youtube, playlist_id):
     """Get basic information about the playlist."""
     request = youtube.playlists().list(part="snippet,contentDetails", id=playlist_id)
@@ -53,20 +186,48 @@ def get_playlist_info(youtube, playlist_id):
     if not response.get("items"):
         raise ValueError(f"Playlist with ID {playlist_id} not found")
 
-    playlist_data = response["items"][0]
+    return _parse_playlist_item(response["items"][0])
 
-    return {
-        "id": playlist_id,
-        "title": playlist_data["snippet"]["title"],
-        "channel_name": playlist_data["snippet"]["channelTitle"],
-        "video_count": playlist_data["contentDetails"]["itemCount"],
-        "url": f"https://www.youtube.com/playlist?list={playlist_id}",
-    }
 
+def get_playlists_info(youtube, playlist_ids):
+    """
+    Basic information about many playlists, 50 per playlists.list call.
+    Returns a dict keyed by playlist ID; playlists that were not found are missing.
+    """
+    playlists_info = {}
+    for i in range(0, len(playlist_ids), 50):
+        request = youtube.playlists().list(
+            part="snippet,contentDetails",
+            id=",".join(playlist_ids[i : i + 50]),
+            maxResults=50,
+        )
+        for item in request.execute().get("items", []):
+            playlists_info[item["id"]] = _parse_playlist_item(item)
+    return playlists_info
 
-def get_playlist_videos(youtube, playlist_id):
-    """Get all video IDs from a playlist."""
-    videos = []
+
+def get_channel_playlists(youtube, channel_id):
+    """Basic information about every public playlist of a channel."""
+    playlists = []
+    next_page_token = None
+
+    while True:
+        request = youtube.playlists().list(
+            part="snippet,contentDetails",
+            channelId=channel_id,
+            maxResults=50,
+            pageToken=next_page_token,
+        )
+        response = request.execute()
+        playlists.extend(_parse_playlist_item(item) for item in response["items"])
+
+        next_page_token = response.get("nextPageToken")
+        if not next_page_token:
+            return playlists
+
+
+def iter_playlist_item_pages(youtube, playlist_id):
+    """Yield the playlist's items one API page (up to 50 items) at a time."""
     next_page_token = None
 
     while True:
@@ -78,203 +239,627 @@ def get_playlist_videos(youtube, playlist_id):
         )
         response = request.execute()
 
-        for item in response["items"]:
-            videos.append(
-                {
-                    "video_id": item["contentDetails"]["videoId"],
-                    "position": item["snippet"]["position"],
-                }
-            )
+        yield [
+            {
+                "video_id": item["contentDetails"]["videoId"],
+                "position": item["snippet"]["position"],
+            }
+            for item in response["items"]
+        ]
 
         next_page_token = response.get("nextPageToken")
         if not next_page_token:
             break
 
+
+def get_playlist_videos(youtube, playlist_id):
+    """Get all video IDs from a playlist."""
+    videos = []
+    for page in iter_playlist_item_pages(youtube, playlist_id):
+        videos.extend(page)
     return videos
 
 
-def get_video_details(youtube, video_ids):
-    """Get details for a list of videos."""
-    all_video_data = []
+def _parse_video_item(item):
+    """Convert a videos.list item into the video dict stored for a playlist."""
+    video_data = {
+        "id": item["id"],
+        "title": item["snippet"]["title"],
+        "channel_name": item["snippet"]["channelTitle"],
+        "upload_date": datetime.datetime.fromisoformat(
+            item["snippet"]["publishedAt"].replace("Z", "+00:00")
+        ),
+        "duration": isodate.parse_duration(
+            item["contentDetails"]["duration"]
+        ).total_seconds()
+        / 60,  # in minutes
+        "views": int(item.get("statistics", {}).get("viewCount", 0)),
+        "likes": int(item.get("statistics", {}).get("likeCount", 0)),
+    }
+
+    # Calculate like percentage
+    if video_data["views"] > 0:
+        video_data["like_percentage"] = (
+            video_data["likes"] / video_data["views"]
+        ) * 100
+    else:
+        video_data["like_percentage"] = 0
+
+    # Create URL
+    video_data["url"] = f"https://www.youtube.com/watch?v={video_data['id']}"
+
+    return video_data
+
+
+def _fetch_video_chunk(youtube, video_ids):
+    """Get details for at most 50 videos with a single videos.list call."""
+    request = youtube.videos().list(
+        part="snippet,contentDetails,statistics", id=",".join(video_ids)
+    )
+    response = request.execute()
+    return [_parse_video_item(item) for item in response["items"]]
 
-    # Process video IDs in chunks of 50 (API limitation)
-    for i in range(0, len(video_ids), 50):
-        chunk = video_ids[i : i + 50]
 
-        request = youtube.videos().list(
-            part="snippet,contentDetails,statistics", id=",".join(chunk)
+class SharedVideoLookup:
+    """
+    videos.list calls shared by the playlists of one batch, so a video that
+    appears in several of them is only looked up once.
+    """
+
+    def __init__(self):
+        self._requests = {}  # video ID -> future of the videos.list call covering it
+        self._lock = threading.Lock()
+
+    def submit(self, executor, youtube, video_ids):
+        """Look up the IDs nobody asked for yet; return the futures covering all of them."""
+        with self._lock:
+            new_ids = [
+                video_id
+                for video_id in dict.fromkeys(video_ids)
+                if video_id not in self._requests
+            ]
+            if new_ids:
+                future = executor.submit(_fetch_video_chunk, youtube, new_ids)
+                for video_id in new_ids:
+                    self._requests[video_id] = future
+            return {self._requests[video_id] for video_id in video_ids}
+
+
+def _load_fresh_videos(session, video_ids, max_age=VIDEO_STATS_MAX_AGE):
+    """Stored details of the given videos whose stats are younger than `max_age` seconds."""
+    cutoff = datetime.datetime.now() - datetime.timedelta(seconds=max_age)
+    return {
+        video.id: {column: getattr(video, column) for column in VIDEO_COLUMNS}
+        for video in session.query(Video).filter(
+            Video.id.in_(video_ids), Video.stats_updated_at >= cutoff
         )
-        response = request.execute()
+    }
 
-        for item in response["items"]:
-            video_data = {
-                "id": item["id"],
-                "title": item["snippet"]["title"],
-                "channel_name": item["snippet"]["channelTitle"],
-                "upload_date": datetime.datetime.fromisoformat(
-                    item["snippet"]["publishedAt"].replace("Z", "+00:00")
-                ),
-                "duration": isodate.parse_duration(
-                    item["contentDetails"]["duration"]
-                ).total_seconds()
-                / 60,  # in minutes
-                "views": int(item.get("statistics", {}).get("viewCount", 0)),
-                "likes": int(item.get("statistics", {}).get("likeCount", 0)),
+
+def fetch_playlist_videos(
+    youtube,
+    playlist_id,
+    max_workers=YOUTUBE_FETCH_CONCURRENCY,
+    video_lookup=None,
+    force_refresh=False,
+):
+    """
+    Get details for every video of a playlist, ordered by playlist position.
+
+    Each page of playlist items is handed to a thread pool for its videos.list
+    call right away, so detail lookups overlap with paging through the playlist.
+    Videos with fresh stats in the database are not requested at all unless
+    force_refresh is set, and with a SharedVideoLookup, videos already requested
+    for another playlist of the same batch are not requested again. Videos
+    fetched from the API are marked with "fetched": True.
+    """
+    pending = []
+    session = get_session(db_engine)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for page in iter_playlist_item_pages(youtube, playlist_id):
+                video_ids = [playlist_item["video_id"] for playlist_item in page]
+                stored = (
+                    {} if force_refresh else _load_fresh_videos(session, video_ids)
+                )
+                missing_ids = [
+                    video_id for video_id in video_ids if video_id not in stored
+                ]
+                if not missing_ids:
+                    futures = set()
+                elif video_lookup is not None:
+                    futures = video_lookup.submit(executor, youtube, missing_ids)
+                else:
+                    futures = {
+                        executor.submit(_fetch_video_chunk, youtube, missing_ids)
+                    }
+                pending.append((page, stored, futures))
+
+            ordered_videos = []
+            for page, stored, futures in pending:
+                video_details_dict = dict(stored)
+                for future in futures:
+                    for video in future.result():
+                        video_details_dict[video["id"]] = {**video, "fetched": True}
+                for playlist_item in page:
+                    video_id = playlist_item["video_id"]
+                    if video_id in video_details_dict:
+                        video_data = video_details_dict[video_id].copy()
+                        video_data["position"] = playlist_item["position"]
+                        ordered_videos.append(video_data)
+    finally:
+        session.close()
+
+    # Sort by playlist position
+    ordered_videos.sort(key=lambda x: x["position"])
+    return ordered_videos
+
+
+# Video fields handed to the playlist page
+RESULT_VIDEO_FIELDS = (
+    "title",
+    "channel_name",
+    "upload_date",
+    "duration",
+    "views",
+    "likes",
+    "like_percentage",
+    "url",
+    "position",
+)
+
+# Columns of the shared videos table
+VIDEO_COLUMNS = (
+    "id",
+    "title",
+    "channel_name",
+    "upload_date",
+    "duration",
+    "views",
+    "likes",
+    "like_percentage",
+    "url",
+)
+
+# Playlist item columns compared against the stored row to decide whether it needs an update
+ITEM_DELTA_FIELDS = ("position", "is_top")
+
+# Video columns compared against the stored row to decide whether a fetched video changed
+VIDEO_DELTA_FIELDS = ("title", "channel_name", "duration", "views", "likes")
+
+# Keep IN (...) lists well under SQLite's bound parameter limit
+SQL_IN_CHUNK_SIZE = 500
+
+
+def _chunks(items, size=SQL_IN_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _apply_video_delta(session, playlist_id, videos):
+    """
+    Bring the stored items of a playlist in line with freshly fetched ones:
+    new videos and videos fetched with changed stats, and new or changed items,
+    go out in bulk upserts; unchanged fetched videos only get their
+    stats_updated_at bumped. Items that left the playlist are deleted in bulk
+    along with videos no playlist contains anymore. Returns the
+    insert/update/delete counts (an item counts as updated when its position,
+    top flag or video stats changed) and the playlists whose stored data changed.
+    """
+    existing = {
+        row.video_id: row
+        for row in session.query(
+            PlaylistItem.video_id,
+            *(getattr(PlaylistItem, field) for field in ITEM_DELTA_FIELDS),
+        ).filter(PlaylistItem.playlist_id == playlist_id)
+    }
+
+    # A video listed twice in the playlist keeps its first position
+    fetched = {}
+    for video in videos:
+        fetched.setdefault(video["id"], video)
+
+    now = datetime.datetime.now()
+    fetched_videos = [video for video in fetched.values() if video.get("fetched")]
+    stored_videos = {}
+    for chunk in _chunks([video["id"] for video in fetched_videos]):
+        stored_videos.update(
+            (row.id, row)
+            for row in session.query(
+                Video.id, *(getattr(Video, field) for field in VIDEO_DELTA_FIELDS)
+            ).filter(Video.id.in_(chunk))
+        )
+    changed_videos = [
+        video
+        for video in fetched_videos
+        if video["id"] not in stored_videos
+        or any(
+            getattr(stored_videos[video["id"]], field) != video[field]
+            for field in VIDEO_DELTA_FIELDS
+        )
+    ]
+    changed_ids = {video["id"] for video in changed_videos}
+    bulk_upsert_videos(
+        session,
+        [
+            {**{column: video[column] for column in VIDEO_COLUMNS}, "stats_updated_at": now}
+            for video in changed_videos
+        ],
+    )
+    # Unchanged stats were still just confirmed, so they count as fresh
+    unchanged_ids = [
+        video["id"] for video in fetched_videos if video["id"] not in changed_ids
+    ]
+    for chunk in _chunks(unchanged_ids):
+        session.execute(
+            update(Video).where(Video.id.in_(chunk)).values(stats_updated_at=now)
+        )
+    # Append the changed stats, and the playlist's totals, to the history
+    captured_at = int(now.timestamp())
+    bulk_insert_stats(
+        session,
+        VideoStat,
+        [
+            {
+                "video_id": video["id"],
+                "captured_at": captured_at,
+                "views": video["views"],
+                "likes": video["likes"],
+            }
+            for video in changed_videos
+        ],
+    )
+    bulk_insert_stats(
+        session,
+        PlaylistStat,
+        [
+            {
+                "playlist_id": playlist_id,
+                "captured_at": captured_at,
+                "views": sum(video["views"] for video in fetched.values()),
+                "likes": sum(video["likes"] for video in fetched.values()),
+                "video_count": len(fetched),
             }
+        ],
+    )
+
+    inserts = []
+    updates = []
+    for video_id, video in fetched.items():
+        row = {
+            "playlist_id": playlist_id,
+            "video_id": video_id,
+            "position": video["position"],
+            "is_top": bool(video["is_top"]),
+        }
+        stored = existing.get(video_id)
+        if stored is None:
+            inserts.append(row)
+        elif video_id in changed_ids or any(
+            getattr(stored, field) != row[field] for field in ITEM_DELTA_FIELDS
+        ):
+            updates.append(row)
+
+    deleted_ids = [video_id for video_id in existing if video_id not in fetched]
+
+    bulk_upsert_playlist_items(session, inserts + updates)
+    for chunk in _chunks(deleted_ids):
+        session.query(PlaylistItem).filter(
+            PlaylistItem.playlist_id == playlist_id,
+            PlaylistItem.video_id.in_(chunk),
+        ).delete(synchronize_session=False)
+    _delete_orphan_videos(session, deleted_ids)
+
+    # Other playlists holding a video whose stats changed see the new stats too
+    changed_playlists = {playlist_id} | _playlists_containing(
+        session, [video["id"] for video in changed_videos]
+    )
+    _update_playlist_aggregates(session, changed_playlists)
+
+    return {
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "deleted": len(deleted_ids),
+        "playlists": sorted(changed_playlists),
+    }
 
-            # Calculate like percentage
-            if video_data["views"] > 0:
-                video_data["like_percentage"] = (
-                    video_data["likes"] / video_data["views"]
-                ) * 100
-            else:
-                video_data["like_percentage"] = 0
 
-            # Create URL
-            video_data["url"] = f"https://www.youtube.com/watch?v={video_data['id']}"
+def _delete_orphan_videos(session, video_ids):
+    """Delete the given videos unless some playlist still contains them."""
+    for chunk in _chunks(video_ids):
+        session.query(Video).filter(
+            Video.id.in_(chunk),
+            ~session.query(PlaylistItem)
+            .filter(PlaylistItem.video_id == Video.id)
+            .exists(),
+        ).delete(synchronize_session=False)
+
+
+def _playlists_containing(session, video_ids):
+    playlist_ids = set()
+    for chunk in _chunks(video_ids):
+        playlist_ids.update(
+            session.scalars(
+                select(PlaylistItem.playlist_id)
+                .where(PlaylistItem.video_id.in_(chunk))
+                .distinct()
+            )
+        )
+    return playlist_ids
 
-            all_video_data.append(video_data)
 
-    return all_video_data
+def _aggregate_row(playlist_id, rows, now):
+    views = np.array([row.views or 0 for row in rows], dtype=np.float64)
+    durations = np.array([row.duration or 0 for row in rows], dtype=np.float64)
+    p25, median, p75, p90 = (
+        np.percentile(views, [25, 50, 75, 90]) if len(rows) else (0.0,) * 4
+    )
+    return {
+        "playlist_id": playlist_id,
+        "video_count": len(rows),
+        "top_count": sum(1 for row in rows if row.is_top),
+        "total_duration": float(durations.sum()),
+        "avg_duration": float(durations.mean()) if len(rows) else 0.0,
+        "total_views": int(views.sum()),
+        "total_likes": sum(row.likes or 0 for row in rows),
+        "views_p25": float(p25),
+        "views_median": float(median),
+        "views_p75": float(p75),
+        "views_p90": float(p90),
+        "newest_upload": max(
+            (row.upload_date for row in rows if row.upload_date), default=None
+        ),
+        "updated_at": now,
+    }
 
 
-def get_or_analyze_playlist(playlist_id, force_refresh=False):
+def _update_playlist_aggregates(session, playlist_ids):
     """
-    Check if playlist data exists in database, if not or if force_refresh is True,
-    fetch and analyze playlist data.
+    Recompute the playlist_stats rows of the given playlists from their stored
+    items, in the caller's transaction so they never disagree with the items.
     """
-    try:
-        session = get_session(db_engine)
+    now = datetime.datetime.now()
+    for chunk in _chunks(sorted(playlist_ids)):
+        rows = session.execute(
+            select(
+                PlaylistItem.playlist_id,
+                PlaylistItem.is_top,
+                Video.duration,
+                Video.views,
+                Video.likes,
+                Video.upload_date,
+            )
+            .join(Video, Video.id == PlaylistItem.video_id)
+            .where(PlaylistItem.playlist_id.in_(chunk))
+            .order_by(PlaylistItem.playlist_id)
+        ).all()
+        by_playlist = {
+            playlist_id: list(group)
+            for playlist_id, group in itertools.groupby(rows, key=lambda row: row.playlist_id)
+        }
+        bulk_upsert_playlist_aggregates(
+            session,
+            [
+                _aggregate_row(playlist_id, by_playlist.get(playlist_id, []), now)
+                for playlist_id in chunk
+            ],
+        )
 
-        # Check if we have this playlist in the database and it's recent (less than 24 hours old)
-        if not force_refresh:
-            existing_playlist = (
-                session.query(Playlist).filter(Playlist.id == playlist_id).first()
+
+def backfill_playlist_aggregates():
+    """Compute playlist_stats for stored playlists that have none yet, e.g. after an upgrade."""
+    session = get_session(db_engine)
+    try:
+        missing = session.scalars(
+            select(Playlist.id).where(
+                ~select(PlaylistAggregate.playlist_id)
+                .where(PlaylistAggregate.playlist_id == Playlist.id)
+                .exists()
             )
-            # Use data if it's less than 24 hours old
-            if (
-                existing_playlist
-                and (
-                    datetime.datetime.now() - existing_playlist.last_updated
-                ).total_seconds()
-                < 86400
-            ):
-                # Update the last_analyzed timestamp
-                existing_playlist.last_analyzed = datetime.datetime.now()
-                session.commit()
-                # Return existing data from database
-                all_videos = [
-                    {
-                        "title": video.title,
-                        "channel_name": video.channel_name,
-                        "upload_date": video.upload_date,
-                        "duration": video.duration,
-                        "views": video.views,
-                        "likes": video.likes,
-                        "like_percentage": video.like_percentage,
-                        "url": video.url,
-                        "position": video.position,
-                    }
-                    for video in existing_playlist.videos
-                ]
+        ).all()
+        if missing:
+            _update_playlist_aggregates(session, missing)
+            session.commit()
+            print(f"Computed stats for {len(missing)} playlists")
+        return len(missing)
+    finally:
+        session.close()
 
-                top_videos = [
-                    {
-                        "title": video.title,
-                        "channel_name": video.channel_name,
-                        "upload_date": video.upload_date,
-                        "duration": video.duration,
-                        "views": video.views,
-                        "likes": video.likes,
-                        "like_percentage": video.like_percentage,
-                        "url": video.url,
-                        "position": video.position,
-                    }
-                    for video in existing_playlist.videos
-                    if video.is_top
-                ]
 
-                playlist_info = {
-                    "id": existing_playlist.id,
-                    "title": existing_playlist.title,
-                    "channel_name": existing_playlist.channel_name,
-                    "video_count": existing_playlist.video_count,
-                    "url": existing_playlist.url,
-                    "last_updated": existing_playlist.last_updated,
-                    "last_analyzed": existing_playlist.last_analyzed,
-                }
+def _stored_items_statement(playlist_id, top_only=False):
+    statement = (
+        select(PlaylistItem)
+        .options(selectinload(PlaylistItem.video))
+        .where(PlaylistItem.playlist_id == playlist_id)
+        .order_by(PlaylistItem.position)
+    )
+    if top_only:
+        statement = statement.where(PlaylistItem.is_top)
+    return statement
+
+
+def _format_stored_playlist(playlist, items, age):
+    all_videos = [
+        {
+            "title": item.video.title,
+            "channel_name": item.video.channel_name,
+            "upload_date": item.video.upload_date,
+            "duration": item.video.duration,
+            "views": item.video.views,
+            "likes": item.video.likes,
+            "like_percentage": item.video.like_percentage,
+            "url": item.video.url,
+            "position": item.position,
+        }
+        for item in items
+    ]
+
+    top_videos = [video for video, item in zip(all_videos, items) if item.is_top]
+
+    playlist_info = {
+        "id": playlist.id,
+        "title": playlist.title,
+        "channel_name": playlist.channel_name,
+        "video_count": playlist.video_count,
+        "url": playlist.url,
+        "last_updated": playlist.last_updated,
+        "last_analyzed": playlist.last_analyzed,
+    }
 
-                session.close()
-                return {
-                    "playlist_info": playlist_info,
-                    "top_videos": top_videos,
-                    "all_videos": all_videos,
-                    "from_cache": True,
-                }
+    return {
+        "playlist_info": playlist_info,
+        "top_videos": top_videos,
+        "all_videos": all_videos,
+        "from_cache": True,
+        "stale": age >= PLAYLIST_MAX_AGE,
+    }
 
-        # If force refresh or the data is older than 24hrs
 
-        youtube = get_authenticated_service()
-        playlist_info = get_playlist_info(youtube, playlist_id)
+def get_stored_playlist(playlist_id, max_age=PLAYLIST_MAX_AGE):
+    """
+    Stored analysis of a playlist, or None if it is missing or older than
+    `max_age` seconds (max_age=None accepts any age). Marks the playlist as viewed.
+    """
+    session = get_session(db_engine)
+    try:
+        existing_playlist = session.get(Playlist, playlist_id)
+        if not existing_playlist:
+            return None
 
-        playlist_videos = get_playlist_videos(youtube, playlist_id)
+        age = (datetime.datetime.now() - existing_playlist.last_updated).total_seconds()
+        if max_age is not None and age >= max_age:
+            return None
 
-        video_ids = [video["video_id"] for video in playlist_videos]
+        # Update the last_analyzed timestamp
+        existing_playlist.last_analyzed = datetime.datetime.now()
+        session.commit()
+        # Return existing data from database
+        items = session.scalars(_stored_items_statement(playlist_id)).all()
+        return _format_stored_playlist(existing_playlist, items, age)
+    finally:
+        session.close()
 
-        video_details = get_video_details(youtube, video_ids)
 
-        video_details_dict = {video["id"]: video for video in video_details}
+async def get_stored_playlist_async(
+    playlist_id, max_age=PLAYLIST_MAX_AGE, top_only=False
+):
+    """
+    get_stored_playlist() for the event loop, on the aiosqlite engine.
+    With top_only, only the top videos are loaded and "all_videos" holds just those;
+    get_playlist_videos_page() serves the full list a page at a time.
+    """
+    async with get_async_session(async_db_engine) as session:
+        existing_playlist = await session.get(Playlist, playlist_id)
+        if not existing_playlist:
+            return None
 
-        # Final list with position information included
-        ordered_videos = []
-        for playlist_item in playlist_videos:
-            video_id = playlist_item["video_id"]
-            if video_id in video_details_dict:
-                video_data = video_details_dict[video_id].copy()
-                video_data["position"] = playlist_item["position"]
-                ordered_videos.append(video_data)
+        age = (datetime.datetime.now() - existing_playlist.last_updated).total_seconds()
+        if max_age is not None and age >= max_age:
+            return None
 
-        # Sort by playlist position
-        ordered_videos.sort(key=lambda x: x["position"])
+        existing_playlist.last_analyzed = datetime.datetime.now()
+        await session.commit()
+        items = (
+            await session.scalars(_stored_items_statement(playlist_id, top_only))
+        ).all()
+        return _format_stored_playlist(existing_playlist, items, age)
 
-        # Analyze data
-        df = pd.DataFrame(ordered_videos)
-        TOP_N_PERCENT = 11 / 100
 
-        if len(df) == 0:
-            session.close()
-            return {"error": "No videos found."}
+# Views answered from the rendered page cache, not yet written to last_analyzed
+_pending_views = {}
+_pending_views_lock = threading.Lock()
 
-        # Calculate normalized and rank data
-        df["views_normalized"] = (
-            df["views"] / df["views"].max() if df["views"].max() > 0 else 0
+
+def mark_viewed(playlist_id):
+    """Record a view without touching the database; flush_viewed() writes it later."""
+    with _pending_views_lock:
+        _pending_views[playlist_id] = datetime.datetime.now()
+
+
+def flush_viewed():
+    """Write the views recorded by mark_viewed() to Playlist.last_analyzed in one executemany."""
+    with _pending_views_lock:
+        views = list(_pending_views.items())
+        _pending_views.clear()
+    if not views:
+        return 0
+
+    session = get_session(db_engine)
+    try:
+        session.execute(
+            update(Playlist.__table__)
+            .where(Playlist.id == bindparam("viewed_id"))
+            .values(last_analyzed=bindparam("viewed_at")),
+            [
+                {"viewed_id": playlist_id, "viewed_at": viewed_at}
+                for playlist_id, viewed_at in views
+            ],
         )
-        df["like_percentage_normalized"] = df["like_percentage"] / 100
-        df["views_rank"] = df["views"].rank(pct=True)
-        df["likes_rank"] = df["like_percentage"].rank(pct=True)
-        df["above_median_views"] = df["views_rank"] >= 0.5
-        df["above_median_likes"] = df["likes_rank"] >= 0.5
-        df["combined_score"] = df["views_normalized"] * df["like_percentage_normalized"]
-        df_candidates = df[df["above_median_views"] & df["above_median_likes"]]
-
-        # Calculate top videos
-        total_video_count = playlist_info["video_count"]
-        if len(df_candidates) > 0:
-            TOP_N_COUNT = len(df) * TOP_N_PERCENT
-            if total_video_count > 5 and TOP_N_COUNT < 5:
-                TOP_N_COUNT = total_video_count // 2
-            else:
-                TOP_N_COUNT = total_video_count - 2
-
-            top_count = max(1, int(TOP_N_COUNT))
-            top_threshold = df_candidates["combined_score"].nlargest(top_count).min()
-            df["is_top"] = (
-                (df["combined_score"] >= top_threshold)
-                & df["above_median_views"]
-                & df["above_median_likes"]
-            )
-        else:
-            df["is_top"] = False
+        session.commit()
+        return len(views)
+    finally:
+        session.close()
+
+
+def get_or_analyze_playlist(playlist_id, force_refresh=False, mark_analyzed=True):
+    """
+    Check if playlist data exists in database, if not or if force_refresh is True,
+    fetch and analyze playlist data.
+    Background refreshes pass mark_analyzed=False so last_analyzed keeps
+    recording when a user last viewed the playlist.
+    """
+    # Use data if it's younger than PLAYLIST_MAX_AGE
+    if not force_refresh:
+        stored = get_stored_playlist(playlist_id)
+        if stored:
+            return stored
+
+    # If force refresh or the data is older than PLAYLIST_MAX_AGE;
+    # concurrent requests for the same playlist share one fetch
+    return playlist_fetches.do(
+        playlist_id,
+        fetch_and_store_playlist,
+        playlist_id,
+        mark_analyzed,
+        force_refresh=force_refresh,
+    )
+
+
+def fetch_playlist(
+    youtube, playlist_id, playlist_info=None, video_lookup=None, force_refresh=False
+):
+    """
+    Fetch a playlist's info and videos from YouTube and flag its top videos.
+    Returns (playlist_info, ordered_videos); ordered_videos is empty if it has none.
+    force_refresh requests the stats of every video, even recently stored ones.
+    """
+    if playlist_info is None:
+        playlist_info = get_playlist_info(youtube, playlist_id)
+    else:
+        playlist_info = dict(playlist_info)
+
+    # Final list with position information included, in playlist order
+    ordered_videos = fetch_playlist_videos(
+        youtube, playlist_id, video_lookup=video_lookup, force_refresh=force_refresh
+    )
+
+    # Analyze data
+    is_top = top_video_mask(
+        [video["views"] for video in ordered_videos],
+        [video["like_percentage"] for video in ordered_videos],
+        playlist_info["video_count"],
+    )
+    for video, video_is_top in zip(ordered_videos, is_top.tolist()):
+        video["is_top"] = video_is_top
+
+    return playlist_info, ordered_videos
+
+
+def store_playlist(playlist_info, ordered_videos, mark_analyzed=True):
+    """Save a fetched playlist and its videos, returning the analysis result."""
+    playlist_id = playlist_info["id"]
+    try:
+        session = get_session(db_engine)
 
         # Save to database
         # First, check if playlist exists
@@ -289,11 +874,8 @@ def get_or_analyze_playlist(playlist_id, force_refresh=False):
             existing_playlist.channel_name = playlist_info["channel_name"]
             existing_playlist.video_count = playlist_info["video_count"]
             existing_playlist.last_updated = now
-            existing_playlist.last_analyzed = now
-
-            # Delete existing videos
-            for video in existing_playlist.videos:
-                session.delete(video)
+            if mark_analyzed:
+                existing_playlist.last_analyzed = now
         else:
             # Create new playlist
             now = datetime.datetime.now()
@@ -307,71 +889,44 @@ def get_or_analyze_playlist(playlist_id, force_refresh=False):
                 last_analyzed=now,
             )
             session.add(new_playlist)
-            session.commit()
 
-        # Add all videos
-        for _, row in df.iterrows():
-            try:
-                new_video = Video(
-                    id=row["id"],
-                    playlist_id=playlist_id,
-                    title=row["title"],
-                    channel_name=row["channel_name"],
-                    upload_date=row["upload_date"],
-                    duration=row["duration"],
-                    views=row["views"],
-                    likes=row["likes"],
-                    like_percentage=row["like_percentage"],
-                    url=row["url"],
-                    position=row["position"],
-                    is_top=row["is_top"],
-                )
-                session.add(new_video)
-                session.flush()
-            except IntegrityError:
-                session.rollback()
-                print(f"Skipping duplicate video: {row['id']} - {row['title']}")
-                continue
+        # Write only what changed since the last refresh
+        changes = _apply_video_delta(session, playlist_id, ordered_videos)
 
         # Commit changes
         try:
             session.commit()
-            print(f"Successfully added new videos to playlist {playlist_id}")
+            print(
+                f"Refreshed playlist {playlist_id}: {changes['inserted']} inserted, "
+                f"{changes['updated']} updated, {changes['deleted']} deleted"
+            )
         except Exception as e:
             session.rollback()
             print(f"Error committing changes: {e}")
+        rendered_pages.invalidate(changes["playlists"])
 
         # Return data
-        top_videos = df[df["is_top"]][
-            [
-                "title",
-                "channel_name",
-                "upload_date",
-                "duration",
-                "views",
-                "likes",
-                "like_percentage",
-                "url",
-                "position",
-            ]
-        ].to_dict(orient="records")
-
-        all_videos = df[
-            [
-                "title",
-                "channel_name",
-                "upload_date",
-                "duration",
-                "views",
-                "likes",
-                "like_percentage",
-                "url",
-                "position",
-            ]
-        ].to_dict(orient="records")
+        all_videos = [
+            {field: video[field] for field in RESULT_VIDEO_FIELDS}
+            for video in ordered_videos
+        ]
+        top_videos = [
+            video
+            for video, stored in zip(all_videos, ordered_videos)
+            if stored["is_top"]
+        ]
 
         # Add timestamps to playlist_info
-        playlist_info.update({"last_updated": now, "last_analyzed": now})
+        playlist_info.update(
+            {
+                "last_updated": now,
+                "last_analyzed": (
+                    now
+                    if mark_analyzed or not existing_playlist
+                    else existing_playlist.last_analyzed
+                ),
+            }
+        )
 
         session.close()
 
@@ -380,6 +935,7 @@ def get_or_analyze_playlist(playlist_id, force_refresh=False):
             "top_videos": top_videos,
             "all_videos": all_videos,
             "from_cache": False,
+            "changes": changes,
         }
 
     except Exception as e:
@@ -391,53 +947,436 @@ def get_or_analyze_playlist(playlist_id, force_refresh=False):
         raise e
 
 
-def get_playlists():
-    try:
+def fetch_and_store_playlist(
+    playlist_id,
+    mark_analyzed=True,
+    playlist_info=None,
+    video_lookup=None,
+    force_refresh=False,
+):
+    """Fetch a playlist from YouTube, analyze it and store the result."""
+    youtube = get_authenticated_service()
+    playlist_info, ordered_videos = fetch_playlist(
+        youtube, playlist_id, playlist_info, video_lookup, force_refresh
+    )
+
+    if len(ordered_videos) == 0:
+        return {"error": "No videos found."}
+
+    return store_playlist(playlist_info, ordered_videos, mark_analyzed)
+
+
+def analyze_playlists(playlist_ids=None, channel_id=None, force_refresh=False):
+    """
+    Analyze many playlists, or every playlist of a channel, yielding a progress
+    event per playlist as it finishes.
+
+    Playlist metadata is looked up 50 playlists per call, playlists are fetched
+    concurrently and videos shared between them are looked up once. Playlists
+    with fresh stored data are skipped unless force_refresh is set.
+    """
+    youtube = get_authenticated_service()
+
+    if channel_id:
+        playlists_info = {
+            info["id"]: info for info in get_channel_playlists(youtube, channel_id)
+        }
+        playlist_ids = list(playlists_info)
+    else:
+        playlist_ids = list(dict.fromkeys(playlist_ids or []))
+        playlists_info = {}
+
+    yield {"event": "started", "total": len(playlist_ids)}
+    counts = {"analyzed": 0, "cached": 0, "failed": 0}
+
+    fresh_ids = set()
+    if not force_refresh:
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=PLAYLIST_MAX_AGE)
         session = get_session(db_engine)
-        existing_playlists = (
-            session.query(Playlist).order_by(Playlist.last_updated.desc()).all()
-        )
-        existing_playlist_info = []
-        for playlist in existing_playlists:
-            all_videos = [
-                {
-                    "title": video.title,
-                    "channel_name": video.channel_name,
-                    "upload_date": video.upload_date.strftime("%Y-%m-%d %H:%M"),
-                    "duration": video.duration,
-                    "views": video.views,
-                    "likes": video.likes,
-                    "like_percentage": video.like_percentage,
-                    "url": video.url,
-                    "position": video.position,
-                    "is_top": video.is_top,
+        try:
+            for chunk in _chunks(playlist_ids):
+                fresh_ids.update(
+                    playlist_id
+                    for (playlist_id,) in session.query(Playlist.id).filter(
+                        Playlist.id.in_(chunk), Playlist.last_updated >= cutoff
+                    )
+                )
+        finally:
+            session.close()
+    for playlist_id in playlist_ids:
+        if playlist_id in fresh_ids:
+            counts["cached"] += 1
+            yield {"event": "playlist", "playlist_id": playlist_id, "status": "cached"}
+
+    to_fetch = [playlist_id for playlist_id in playlist_ids if playlist_id not in fresh_ids]
+    missing_info = [
+        playlist_id for playlist_id in to_fetch if playlist_id not in playlists_info
+    ]
+    playlists_info.update(get_playlists_info(youtube, missing_info))
+
+    video_lookup = SharedVideoLookup()
+    with ThreadPoolExecutor(max_workers=BATCH_ANALYZE_CONCURRENCY) as executor:
+        futures = {}
+        for playlist_id in to_fetch:
+            if playlist_id not in playlists_info:
+                counts["failed"] += 1
+                yield {
+                    "event": "playlist",
+                    "playlist_id": playlist_id,
+                    "status": "failed",
+                    "error": f"Playlist with ID {playlist_id} not found",
                 }
-                for video in playlist.videos
-            ]
+                continue
+            future = executor.submit(
+                playlist_fetches.do,
+                playlist_id,
+                fetch_and_store_playlist,
+                playlist_id,
+                True,
+                playlists_info[playlist_id],
+                video_lookup,
+                force_refresh,
+            )
+            futures[future] = playlist_id
 
-            existing_playlist_info.append(
-                {
-                    "id": playlist.id,
-                    "title": playlist.title,
-                    "channel_name": playlist.channel_name,
-                    "all_video_count": playlist.video_count,
-                    "url": playlist.url,
-                    "last_updated": playlist.last_updated.strftime("%Y-%m-%d %H:%M"),
-                    "last_analyzed": playlist.last_analyzed.strftime("%Y-%m-%d %H:%M"),
-                    "all_videos": all_videos,
+        for future in as_completed(futures):
+            playlist_id = futures[future]
+            try:
+                result = future.result()
+                if "error" in result:
+                    raise ValueError(result["error"])
+            except Exception as e:
+                counts["failed"] += 1
+                yield {
+                    "event": "playlist",
+                    "playlist_id": playlist_id,
+                    "status": "failed",
+                    "error": str(e),
                 }
+                continue
+
+            counts["analyzed"] += 1
+            yield {
+                "event": "playlist",
+                "playlist_id": playlist_id,
+                "status": "analyzed",
+                "title": result["playlist_info"]["title"],
+                "video_count": len(result["all_videos"]),
+                "top_video_count": len(result["top_videos"]),
+            }
+
+    yield {"event": "completed", "total": len(playlist_ids), **counts}
+
+
+def get_playlist_ids():
+    """IDs of all stored playlists, most recently updated first."""
+    session = get_session(db_engine)
+    try:
+        return [
+            playlist_id
+            for (playlist_id,) in session.query(Playlist.id).order_by(
+                Playlist.last_updated.desc()
             )
+        ]
+    finally:
+        session.close()
 
-        return existing_playlist_info
-    except Exception as e:
-        import traceback
 
-        traceback.print_exc()
+# Video fields included in the sync payload
+PAYLOAD_VIDEO_FIELDS = RESULT_VIDEO_FIELDS + ("is_top",)
+
+
+def _stored_video_column(field):
+    """Column holding a video field: per playlist item or shared per video."""
+    if field in ITEM_DELTA_FIELDS:
+        return getattr(PlaylistItem, field)
+    return getattr(Video, field)
+
+
+def get_stale_playlists(max_age=PLAYLIST_MAX_AGE, limit=None):
+    """
+    Playlists last fetched more than `max_age` seconds ago, most recently viewed first.
+    Returns (id, video_count) pairs; the range filter uses idx_playlist_last_updated.
+    """
+    cutoff = datetime.datetime.now() - datetime.timedelta(seconds=max_age)
+    session = get_session(db_engine)
+    try:
+        query = (
+            session.query(Playlist.id, Playlist.video_count)
+            .filter(Playlist.last_updated < cutoff)
+            .order_by(Playlist.last_analyzed.desc(), Playlist.id)
+        )
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+    finally:
+        session.close()
+
+
+def iter_playlist_payloads(playlist_ids, columnar=False):
+    """
+    Yield the sync payload of each playlist, reading one playlist's videos at a time.
+
+    With `columnar`, videos are sent as `video_columns` ({field: [values]}) instead
+    of the `all_videos` list of dicts, which avoids repeating every key per video.
+    """
+    for playlist_id in playlist_ids:
+        # A short session per playlist so no read transaction is held open
+        # between playlists while the caller is busy sending
+        session = get_session(db_engine)
         try:
+            playlist = (
+                session.query(Playlist).filter(Playlist.id == playlist_id).first()
+            )
+            if not playlist:
+                continue
+            rows = (
+                session.query(
+                    *(_stored_video_column(field) for field in PAYLOAD_VIDEO_FIELDS)
+                )
+                .join(Video, Video.id == PlaylistItem.video_id)
+                .filter(PlaylistItem.playlist_id == playlist_id)
+                .order_by(PlaylistItem.position)
+                .all()
+            )
+            payload = {
+                "id": playlist.id,
+                "title": playlist.title,
+                "channel_name": playlist.channel_name,
+                "all_video_count": playlist.video_count,
+                "url": playlist.url,
+                "last_updated": playlist.last_updated.strftime("%Y-%m-%d %H:%M"),
+                "last_analyzed": playlist.last_analyzed.strftime("%Y-%m-%d %H:%M"),
+            }
+        finally:
             session.close()
-        except:
-            pass
-        raise e
+
+        videos = [
+            {
+                **row._asdict(),
+                "upload_date": row.upload_date.strftime("%Y-%m-%d %H:%M"),
+            }
+            for row in rows
+        ]
+        if columnar:
+            payload["video_columns"] = {
+                field: [video[field] for video in videos]
+                for field in PAYLOAD_VIDEO_FIELDS
+            }
+        else:
+            payload["all_videos"] = videos
+
+        yield payload
+
+
+def parse_playlist_cursor(cursor):
+    """Turn a cursor from get_playlist_summaries() back into a (last_updated, id) pair."""
+    last_updated, _, playlist_id = cursor.partition("|")
+    return datetime.datetime.fromisoformat(last_updated), playlist_id
+
+
+# Sort keys accepted by get_playlist_videos_page(); position also breaks ties
+VIDEO_SORT_FIELDS = (
+    "position",
+    "views",
+    "likes",
+    "like_percentage",
+    "duration",
+    "upload_date",
+)
+
+
+def _video_sort_column(sort):
+    return PlaylistItem.position if sort == "position" else getattr(Video, sort)
+
+
+def parse_video_cursor(cursor, sort):
+    """Turn a cursor from get_playlist_videos_page() back into a (value, position) pair."""
+    value, _, position = cursor.rpartition("|")
+    if sort == "upload_date":
+        value = datetime.datetime.fromisoformat(value)
+    elif sort in ("like_percentage", "duration"):
+        value = float(value)
+    else:
+        value = int(value)
+    return value, int(position)
+
+
+def _video_cursor(row, sort):
+    value = getattr(row, sort)
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    return f"{value}|{row.position}"
+
+
+async def get_playlist_videos_page(
+    playlist_id,
+    sort="position",
+    descending=False,
+    limit=100,
+    after=None,
+    search=None,
+    top_only=False,
+):
+    """
+    One page of a playlist's videos, sorted on a VIDEO_SORT_FIELDS column with
+    position as tie-breaker. `after` is a (value, position) keyset position from
+    the previous page's cursor; `search` matches title or channel name.
+    Returns (videos, next_cursor), next_cursor being None on the last page.
+    """
+    column = _video_sort_column(sort)
+    statement = (
+        select(
+            *(getattr(Video, field) for field in RESULT_VIDEO_FIELDS if field != "position"),
+            PlaylistItem.position,
+            PlaylistItem.is_top,
+        )
+        .join(Video, Video.id == PlaylistItem.video_id)
+        .where(PlaylistItem.playlist_id == playlist_id)
+    )
+    if top_only:
+        statement = statement.where(PlaylistItem.is_top)
+    if search:
+        pattern = f"%{search}%"
+        statement = statement.where(
+            or_(Video.title.like(pattern), Video.channel_name.like(pattern))
+        )
+
+    if sort == "position":
+        if after:
+            _, after_position = after
+            position_filter = (
+                PlaylistItem.position < after_position
+                if descending
+                else PlaylistItem.position > after_position
+            )
+            statement = statement.where(position_filter)
+        order = [column.desc() if descending else column]
+    else:
+        if after:
+            after_value, after_position = after
+            statement = statement.where(
+                or_(
+                    column < after_value if descending else column > after_value,
+                    and_(column == after_value, PlaylistItem.position > after_position),
+                )
+            )
+        order = [column.desc() if descending else column, PlaylistItem.position]
+
+    # Fetch one extra row to know whether another page exists
+    statement = statement.order_by(*order).limit(limit + 1)
+    async with async_db_engine.connect() as connection:
+        rows = (await connection.execute(statement)).all()
+
+    next_cursor = _video_cursor(rows[limit - 1], sort) if len(rows) > limit else None
+    return [row._asdict() for row in rows[:limit]], next_cursor
+
+
+def _summary_page_statement(limit=None, before=None):
+    statement = select(Playlist).order_by(
+        Playlist.last_updated.desc(), Playlist.id.desc()
+    )
+    if before:
+        before_updated, before_id = before
+        statement = statement.where(
+            or_(
+                Playlist.last_updated < before_updated,
+                and_(
+                    Playlist.last_updated == before_updated,
+                    Playlist.id < before_id,
+                ),
+            )
+        )
+    if limit:
+        statement = statement.limit(limit)
+    return statement
+
+
+def _summary_aggregate_statement(playlist_ids):
+    # One precomputed playlist_stats row per playlist on this page
+    return select(
+        PlaylistAggregate.playlist_id,
+        PlaylistAggregate.top_count,
+        PlaylistAggregate.total_duration,
+        PlaylistAggregate.total_views,
+    ).where(PlaylistAggregate.playlist_id.in_(playlist_ids))
+
+
+def _format_summaries(playlists, rows):
+    video_stats = {
+        playlist_id: (top_count, total_duration, total_views)
+        for playlist_id, top_count, total_duration, total_views in rows
+    }
+    summaries = []
+    for playlist in playlists:
+        top_count, total_duration, total_views = video_stats.get(playlist.id, (0, 0, 0))
+        summaries.append(
+            {
+                "id": playlist.id,
+                "title": playlist.title,
+                "channel_name": playlist.channel_name,
+                "all_video_count": playlist.video_count,
+                "url": playlist.url,
+                "last_updated": playlist.last_updated.strftime("%Y-%m-%d %H:%M"),
+                "last_analyzed": playlist.last_analyzed.strftime("%Y-%m-%d %H:%M"),
+                "top_video_count": top_count,
+                "total_duration": total_duration,
+                "total_views": total_views,
+                "cursor": f"{playlist.last_updated.isoformat()}|{playlist.id}",
+            }
+        )
+    return summaries
+
+
+def get_playlist_summaries(limit=None, before=None):
+    """
+    Get playlist-level columns plus their playlist_stats aggregates, newest
+    first, without loading any Video rows. iter_playlist_payloads() is the full export.
+
+    `before` is a (last_updated, id) keyset position; only playlists that sort
+    after it are returned. Each summary carries a `cursor` string for the next page.
+    """
+    session = get_session(db_engine)
+    try:
+        playlists = session.scalars(_summary_page_statement(limit, before)).all()
+        rows = []
+        if playlists:
+            rows = session.execute(
+                _summary_aggregate_statement([playlist.id for playlist in playlists])
+            ).all()
+        return _format_summaries(playlists, rows)
+    finally:
+        session.close()
+
+
+async def get_playlist_version(playlist_id):
+    """
+    When the playlist's stored data last changed, in any process: the
+    playlist_stats updated_at every write to its items or their videos' stats
+    sets. None if the playlist isn't stored.
+    """
+    async with get_async_session(async_db_engine) as session:
+        return await session.scalar(
+            select(PlaylistAggregate.updated_at).where(
+                PlaylistAggregate.playlist_id == playlist_id
+            )
+        )
+
+
+async def get_playlist_summaries_async(limit=None, before=None):
+    """get_playlist_summaries() for the event loop, on the aiosqlite engine."""
+    async with get_async_session(async_db_engine) as session:
+        playlists = (
+            await session.scalars(_summary_page_statement(limit, before))
+        ).all()
+        rows = []
+        if playlists:
+            rows = (
+                await session.execute(
+                    _summary_aggregate_statement([playlist.id for playlist in playlists])
+                )
+            ).all()
+        return _format_summaries(playlists, rows)
 
 
 def delete_playlist(playlist_id):
@@ -449,8 +1388,20 @@ def delete_playlist(playlist_id):
             session.close()
             return True
 
-        # Delete all associated videos first
-        session.query(Video).filter(Video.playlist_id == playlist_id).delete()
+        # Delete its items first, then the videos no other playlist contains
+        video_ids = [
+            video_id
+            for (video_id,) in session.query(PlaylistItem.video_id).filter(
+                PlaylistItem.playlist_id == playlist_id
+            )
+        ]
+        session.query(PlaylistItem).filter(
+            PlaylistItem.playlist_id == playlist_id
+        ).delete(synchronize_session=False)
+        _delete_orphan_videos(session, video_ids)
+        session.query(PlaylistAggregate).filter(
+            PlaylistAggregate.playlist_id == playlist_id
+        ).delete(synchronize_session=False)
 
         # Delete the playlist
         session.delete(playlist)
@@ -458,6 +1409,7 @@ def delete_playlist(playlist_id):
         # Commit the changes
         session.commit()
         session.close()
+        rendered_pages.invalidate([playlist_id])
         return True
     except Exception as e:
         import traceback
@@ -468,3 +1420,321 @@ def delete_playlist(playlist_id):
         except:
             pass
         return False
+
+
+async def get_library_stats():
+    """
+    Library-wide totals and per-playlist distributions for the dashboard,
+    read from playlist_stats: one row per playlist, never the videos.
+    """
+    statement = (
+        select(Playlist.id, Playlist.title, Playlist.channel_name, PlaylistAggregate)
+        .join(PlaylistAggregate, PlaylistAggregate.playlist_id == Playlist.id)
+        .order_by(PlaylistAggregate.total_views.desc())
+    )
+    async with get_async_session(async_db_engine) as session:
+        rows = (await session.execute(statement)).all()
+
+    playlists = [
+        {
+            "id": playlist_id,
+            "title": title,
+            "channel_name": channel_name,
+            **{
+                column.name: getattr(aggregate, column.name)
+                for column in PlaylistAggregate.__table__.columns
+                if column.name != "playlist_id"
+            },
+        }
+        for playlist_id, title, channel_name, aggregate in rows
+    ]
+    totals = {
+        "playlists": len(playlists),
+        "videos": sum(playlist["video_count"] for playlist in playlists),
+        "top_videos": sum(playlist["top_count"] for playlist in playlists),
+        "total_duration": sum(playlist["total_duration"] for playlist in playlists),
+        "total_views": sum(playlist["total_views"] for playlist in playlists),
+        "total_likes": sum(playlist["total_likes"] for playlist in playlists),
+        "newest_upload": max(
+            (p["newest_upload"] for p in playlists if p["newest_upload"]), default=None
+        ),
+    }
+    return {"totals": totals, "playlists": playlists}
+
+
+# Ranked matches from the videos_fts index, best first (see database.VIDEO_SEARCH_DDL).
+# ORDER BY rank LIMIT runs inside FTS5, which ranks every match but keeps only
+# the page in memory; the join then only looks up that page's videos
+VIDEO_SEARCH_STATEMENT = text(
+    f"SELECT {', '.join('videos.' + column for column in VIDEO_COLUMNS)} "
+    "FROM (SELECT rowid, rank FROM videos_fts WHERE videos_fts MATCH :match "
+    "ORDER BY rank LIMIT :limit OFFSET :offset) AS hits "
+    "JOIN videos ON videos.rowid = hits.rowid "
+    "ORDER BY hits.rank"
+).columns(*(Video.__table__.c[column] for column in VIDEO_COLUMNS))
+
+
+def build_search_query(query):
+    """
+    Turn free text into an FTS5 query matching every word, the last one as a
+    prefix so results follow what is being typed.
+    """
+    words = [f'"{word}"' for word in re.findall(r"\w+", query)]
+    if words:
+        words[-1] += "*"
+    return " ".join(words)
+
+
+async def search_videos(query, limit=20, offset=0):
+    """
+    Stored videos whose title or channel name contain every word of `query`,
+    best bm25 rank first. Each video lists the playlists it is in.
+    Returns (videos, has_more).
+    """
+    match = build_search_query(query)
+    if not match:
+        return [], False
+
+    async with async_db_engine.connect() as connection:
+        # Fetch one extra row to know whether another page exists
+        rows = (
+            await connection.execute(
+                VIDEO_SEARCH_STATEMENT,
+                {"match": match, "limit": limit + 1, "offset": offset},
+            )
+        ).all()
+        videos = [{**row._asdict(), "playlists": []} for row in rows[:limit]]
+        if videos:
+            by_id = {video["id"]: video for video in videos}
+            memberships = await connection.execute(
+                select(PlaylistItem.video_id, Playlist.id, Playlist.title)
+                .join(Playlist, Playlist.id == PlaylistItem.playlist_id)
+                .where(PlaylistItem.video_id.in_(list(by_id)))
+                .order_by(Playlist.title)
+            )
+            for video_id, playlist_id, title in memberships:
+                by_id[video_id]["playlists"].append({"id": playlist_id, "title": title})
+
+    return videos, len(rows) > limit
+
+
+# Stats snapshots younger than this many days are all kept
+STATS_RAW_DAYS = int(os.environ.get("STATS_RAW_DAYS", 7))
+# Older snapshots are thinned to the last one per video and day, and dropped after this many days
+STATS_RETENTION_DAYS = int(os.environ.get("STATS_RETENTION_DAYS", 730))
+
+GROWTH_BUCKETS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+
+
+def _downsample_stats(session, model, key, raw_cutoff, retention_cutoff):
+    """Delete snapshots past retention, and older ones that have a later snapshot the same day."""
+    expired = session.execute(
+        delete(model).where(model.captured_at < retention_cutoff)
+    ).rowcount
+    later = aliased(model)
+    # Each existence check is a short range scan of the (key, captured_at) primary key
+    thinned = session.execute(
+        delete(model).where(
+            model.captured_at < raw_cutoff,
+            select(later.captured_at)
+            .where(
+                getattr(later, key) == getattr(model, key),
+                later.captured_at > model.captured_at,
+                later.captured_at < (model.captured_at // 86400 + 1) * 86400,
+            )
+            .exists(),
+        )
+    ).rowcount
+    return expired, thinned
+
+
+def compact_video_stats(now=None):
+    """
+    Downsample the stats history: keep every snapshot of the last STATS_RAW_DAYS,
+    the last snapshot per video (or playlist) and day before that, and nothing
+    older than STATS_RETENTION_DAYS. Returns the number of deleted snapshots.
+    """
+    now = int((now or datetime.datetime.now()).timestamp())
+    raw_cutoff = now - STATS_RAW_DAYS * 86400
+    retention_cutoff = now - STATS_RETENTION_DAYS * 86400
+
+    session = get_session(db_engine)
+    try:
+        expired, thinned = 0, 0
+        for model, key in ((VideoStat, "video_id"), (PlaylistStat, "playlist_id")):
+            model_expired, model_thinned = _downsample_stats(
+                session, model, key, raw_cutoff, retention_cutoff
+            )
+            expired += model_expired
+            thinned += model_thinned
+        session.commit()
+        if expired or thinned:
+            print(f"Compacted stats history: {expired} expired, {thinned} downsampled")
+        return expired + thinned
+    finally:
+        session.close()
+
+
+def get_playlist_growth(playlist_id, days=30, bucket="day", video_id=None):
+    """
+    Views and likes of a playlist over time, one point per bucket using the
+    last snapshot in it. Reads the playlist's own totals history, or a single
+    video's history when `video_id` is given; both are primary key range scans.
+    """
+    bucket_seconds = GROWTH_BUCKETS[bucket]
+    since = int(datetime.datetime.now().timestamp()) - days * 86400
+
+    if video_id:
+        model, key, video_count = VideoStat, VideoStat.video_id == video_id, None
+    else:
+        model, key = PlaylistStat, PlaylistStat.playlist_id == playlist_id
+        video_count = PlaylistStat.video_count
+
+    session = get_session(db_engine)
+    try:
+        query = (
+            select(
+                model.captured_at,
+                model.views,
+                model.likes,
+                video_count if video_count is not None else literal(1),
+            )
+            .where(key, model.captured_at >= since)
+            .order_by(model.captured_at)
+        )
+        points = {}
+        for captured_at, views, likes, videos in session.execute(query):
+            # Later snapshots overwrite earlier ones in the same bucket
+            bucket_time = captured_at // bucket_seconds * bucket_seconds
+            points[bucket_time] = {
+                "time": datetime.datetime.fromtimestamp(bucket_time).isoformat(),
+                "views": views,
+                "likes": likes,
+                "videos": videos,
+            }
+        return list(points.values())
+    finally:
+        session.close()
+
+
+# Playlists scored together per call when re-scoring the library
+RESCORE_BATCH_SIZE = 200
+
+
+def _iter_rescore_batches(session, playlist_ids=None):
+    """
+    Yield the stored scoring columns of RESCORE_BATCH_SIZE playlists at a time,
+    reading one batch of playlists per query.
+    """
+    if not playlist_ids:
+        playlist_ids = [
+            playlist_id
+            for (playlist_id,) in session.query(Playlist.id).order_by(Playlist.id)
+        ]
+
+    for chunk in _chunks(playlist_ids, RESCORE_BATCH_SIZE):
+        rows = (
+            session.query(
+                PlaylistItem.playlist_id,
+                PlaylistItem.video_id,
+                Video.views,
+                Video.like_percentage,
+                PlaylistItem.is_top,
+                Playlist.video_count,
+            )
+            .join(Video, Video.id == PlaylistItem.video_id)
+            .join(Playlist, Playlist.id == PlaylistItem.playlist_id)
+            .filter(PlaylistItem.playlist_id.in_(chunk))
+            .order_by(PlaylistItem.playlist_id, PlaylistItem.position)
+            .all()
+        )
+        item_keys, views, like_percentage, stored_is_top = [], [], [], []
+        lengths, total_video_counts = [], []
+        for _, playlist_rows in itertools.groupby(rows, key=lambda row: row.playlist_id):
+            playlist_rows = list(playlist_rows)
+            for row in playlist_rows:
+                item_keys.append((row.playlist_id, row.video_id))
+                views.append(row.views or 0)
+                like_percentage.append(row.like_percentage or 0)
+                stored_is_top.append(bool(row.is_top))
+            lengths.append(len(playlist_rows))
+            total_video_counts.append(playlist_rows[0].video_count or 0)
+        yield {
+            "item_keys": item_keys,
+            "stored_is_top": np.array(stored_is_top, dtype=bool),
+            "playlists": len(lengths),
+            "args": (views, like_percentage, lengths, total_video_counts),
+        }
+
+
+def rescore_playlists(playlist_ids=None, workers=1):
+    """
+    Recompute PlaylistItem.is_top for stored playlists from the views and like
+    percentages already in the database, without calling the YouTube API.
+    Scoring runs across `workers` processes, at most one per CPU; only flags
+    that changed are written back. Returns playlist, video and changed-flag counts.
+    """
+    workers = max(1, min(workers, os.cpu_count() or 1))
+    session = get_session(db_engine)
+    # Workers are spawned, not forked: the caller may be a multi-threaded server
+    executor = (
+        ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        if workers > 1
+        else None
+    )
+    counts = {"playlists": 0, "videos": 0, "changed": 0}
+
+    def write_changes(batch, is_top):
+        changed = np.flatnonzero(is_top != batch["stored_is_top"])
+        if len(changed):
+            session.execute(
+                update(PlaylistItem),
+                [
+                    {
+                        "playlist_id": batch["item_keys"][i][0],
+                        "video_id": batch["item_keys"][i][1],
+                        "is_top": bool(is_top[i]),
+                    }
+                    for i in changed
+                ],
+            )
+            changed_playlists = {batch["item_keys"][i][0] for i in changed}
+            _update_playlist_aggregates(session, changed_playlists)
+            session.commit()
+            rendered_pages.invalidate(changed_playlists)
+        counts["playlists"] += batch["playlists"]
+        counts["videos"] += len(batch["item_keys"])
+        counts["changed"] += len(changed)
+
+    try:
+        if executor:
+            # Keep a couple of batches per worker in flight to bound memory
+            pending = []
+            for batch in _iter_rescore_batches(session, playlist_ids):
+                pending.append(
+                    (batch, executor.submit(score_playlists, *batch["args"]))
+                )
+                if len(pending) >= workers * 2:
+                    write_changes(*_pop_result(pending))
+            while pending:
+                write_changes(*_pop_result(pending))
+        else:
+            for batch in _iter_rescore_batches(session, playlist_ids):
+                write_changes(batch, score_playlists(*batch["args"]))
+
+        print(
+            f"Rescored {counts['playlists']} playlists ({counts['videos']} videos), "
+            f"{counts['changed']} top flags changed"
+        )
+        return counts
+    finally:
+        if executor:
+            executor.shutdown()
+        session.close()
+
+
+def _pop_result(pending):
+    batch, future = pending.pop(0)
+    return batch, future.result()
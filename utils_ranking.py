@@ -0,0 +1,101 @@
+# utils_ranking.py
+import numpy as np
+
+TOP_N_PERCENT = 11 / 100
+
+
+def _segment_starts(lengths):
+    """Offset of each playlist's first video in the concatenated arrays."""
+    starts = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    return starts
+
+
+def _segment_pct_rank(values, group, starts, lengths):
+    """
+    Percentile rank of every value within its playlist, averaging ties.
+    Matches pandas' Series.rank(pct=True) applied to each playlist separately.
+    """
+    order = np.lexsort((values, group))
+    sorted_values = values[order]
+    sorted_group = group[order]
+
+    # Runs of equal values inside the same playlist share their average rank
+    tie_break = np.ones(len(values), dtype=bool)
+    tie_break[1:] = (sorted_values[1:] != sorted_values[:-1]) | (
+        sorted_group[1:] != sorted_group[:-1]
+    )
+    tie_start = np.flatnonzero(tie_break)
+    tie_end = np.append(tie_start[1:], len(values))
+    group_start = starts[sorted_group[tie_start]]
+    average_rank = ((tie_start - group_start + 1) + (tie_end - group_start)) / 2
+
+    ranks = np.empty(len(values), dtype=np.float64)
+    ranks[order] = np.repeat(average_rank, tie_end - tie_start)
+    return ranks / lengths[group]
+
+
+def score_playlists(views, like_percentage, lengths, total_video_counts):
+    """
+    Flag the top videos of many playlists in one vectorized pass.
+
+    `views` and `like_percentage` hold the videos of every playlist back to back,
+    `lengths` says how many videos each playlist contributes and
+    `total_video_counts` is each playlist's reported video count.
+    Returns the boolean is_top mask over all videos.
+    """
+    views = np.asarray(views, dtype=np.float64)
+    like_percentage = np.asarray(like_percentage, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    total_video_counts = np.asarray(total_video_counts, dtype=np.int64)
+
+    if len(views) == 0:
+        return np.zeros(0, dtype=bool)
+
+    group = np.repeat(np.arange(len(lengths)), lengths)
+    starts = _segment_starts(lengths)
+    non_empty = lengths > 0
+
+    # Views relative to the most viewed video of the same playlist
+    max_views = np.zeros(len(lengths), dtype=np.float64)
+    max_views[non_empty] = np.maximum.reduceat(views, starts[non_empty])
+    playlist_max = max_views[group]
+    views_normalized = np.divide(
+        views, playlist_max, out=np.zeros_like(views), where=playlist_max > 0
+    )
+    combined_score = views_normalized * (like_percentage / 100)
+
+    # Only videos above the median on both views and likes can be top videos
+    candidates = (_segment_pct_rank(views, group, starts, lengths) >= 0.5) & (
+        _segment_pct_rank(like_percentage, group, starts, lengths) >= 0.5
+    )
+    candidate_counts = np.bincount(group[candidates], minlength=len(lengths))
+
+    top_n_count = np.where(
+        (total_video_counts > 5) & (lengths * TOP_N_PERCENT < 5),
+        total_video_counts // 2,
+        total_video_counts - 2,
+    )
+    top_count = np.minimum(np.maximum(1, top_n_count), candidate_counts)
+
+    # The threshold is the top_count-th best candidate score of each playlist
+    candidate_idx = np.flatnonzero(candidates)
+    candidate_idx = candidate_idx[
+        np.lexsort((-combined_score[candidate_idx], group[candidate_idx]))
+    ]
+    has_candidates = candidate_counts > 0
+    threshold = np.full(len(lengths), np.inf)
+    threshold[has_candidates] = combined_score[
+        candidate_idx[
+            _segment_starts(candidate_counts)[has_candidates]
+            + top_count[has_candidates]
+            - 1
+        ]
+    ]
+
+    return candidates & (combined_score >= threshold[group])
+
+
+def top_video_mask(views, like_percentage, total_video_count):
+    """Flag the top videos of a single playlist."""
+    return score_playlists(views, like_percentage, [len(views)], [total_video_count])
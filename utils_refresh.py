@@ -0,0 +1,263 @@
+# utils_refresh.py
+import os
+import math
+import asyncio
+import time
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+import googleapiclient.errors
+
+from utils_playlist import (
+    PLAYLIST_MAX_AGE,
+    TOKEN_FILE,
+    compact_video_stats,
+    fetch_and_store_playlist,
+    flush_viewed,
+    get_stale_playlists,
+    get_stored_playlist_async,
+    playlist_fetches,
+)
+
+# Set to 0 to only refresh playlists when they are opened
+AUTO_REFRESH_ENABLED = os.environ.get("AUTO_REFRESH_ENABLED", "1") == "1"
+# Seconds between scans for stale playlists
+AUTO_REFRESH_INTERVAL = float(os.environ.get("AUTO_REFRESH_INTERVAL", 300))
+# Playlists are refreshed this many seconds before they reach PLAYLIST_MAX_AGE,
+# so visitors keep getting data from the database
+AUTO_REFRESH_LEAD_TIME = int(
+    os.environ.get("AUTO_REFRESH_LEAD_TIME", min(3600, PLAYLIST_MAX_AGE // 4))
+)
+# YouTube API quota units the refresher may spend per AUTO_REFRESH_QUOTA_WINDOW seconds
+AUTO_REFRESH_QUOTA = int(os.environ.get("AUTO_REFRESH_QUOTA", 5000))
+AUTO_REFRESH_QUOTA_WINDOW = float(os.environ.get("AUTO_REFRESH_QUOTA_WINDOW", 86400))
+# Minimum seconds between two playlist refreshes
+AUTO_REFRESH_MIN_DELAY = float(os.environ.get("AUTO_REFRESH_MIN_DELAY", 2.0))
+# Seconds between two downsampling passes over the video stats history
+STATS_COMPACT_INTERVAL = float(os.environ.get("STATS_COMPACT_INTERVAL", 86400))
+# Seconds before a playlist whose refresh failed is tried again
+AUTO_REFRESH_RETRY_DELAY = float(os.environ.get("AUTO_REFRESH_RETRY_DELAY", 3600))
+# Seconds between writes of the views served from the page cache
+VIEW_FLUSH_INTERVAL = float(os.environ.get("VIEW_FLUSH_INTERVAL", 60))
+
+# Playlist refreshes running at once for page views and the auto refresher
+REFRESH_WORKERS = int(os.environ.get("REFRESH_WORKERS", 4))
+
+# Every list request costs one quota unit and returns at most 50 items
+YOUTUBE_PAGE_SIZE = 50
+
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=REFRESH_WORKERS, thread_name_prefix="playlist-refresh"
+)
+
+
+def refresh_playlist(playlist_id, mark_analyzed=True, force_refresh=False):
+    """
+    Re-fetch a playlist in the background, or join the fetch already running.
+    Returns a Future for the fetch_and_store_playlist() result.
+    """
+    return playlist_fetches.submit(
+        _refresh_executor,
+        playlist_id,
+        fetch_and_store_playlist,
+        playlist_id,
+        mark_analyzed,
+        force_refresh=force_refresh,
+    )
+
+
+def is_refreshing(playlist_id):
+    return playlist_fetches.in_flight(playlist_id)
+
+
+async def get_playlist_stale_while_revalidate(
+    playlist_id, force_refresh=False, top_only=False
+):
+    """
+    Serve stored data right away, even when it is stale, and refresh stale
+    data in the background with "refreshing": True in the result.
+    Missing playlists and forced refreshes wait for the (shared) fetch, which
+    runs on the refresh executor so the event loop keeps serving requests.
+    top_only skips loading the full video list of stored playlists.
+    """
+    if not force_refresh:
+        stored = await get_stored_playlist_async(
+            playlist_id, max_age=None, top_only=top_only
+        )
+        if stored:
+            stored["refreshing"] = is_refreshing(playlist_id)
+            if stored["stale"]:
+                refresh_playlist(playlist_id)
+                stored["refreshing"] = True
+            return stored
+
+    result = await asyncio.wrap_future(
+        refresh_playlist(playlist_id, force_refresh=force_refresh)
+    )
+    return {**result, "refreshing": False}
+
+
+def estimate_refresh_cost(video_count):
+    """Quota units spent refreshing a playlist: playlists.list plus the item and video pages"""
+    pages = max(1, math.ceil((video_count or 0) / YOUTUBE_PAGE_SIZE))
+    return 1 + 2 * pages
+
+
+class QuotaBudget:
+    """Sliding window of quota units spent by the refresher"""
+
+    def __init__(self, limit=AUTO_REFRESH_QUOTA, window=AUTO_REFRESH_QUOTA_WINDOW):
+        self.limit = limit
+        self.window = window
+        self.spent = collections.deque()  # (timestamp, units)
+        self.total = 0
+
+    def _expire(self, now):
+        while self.spent and self.spent[0][0] <= now - self.window:
+            self.total -= self.spent.popleft()[1]
+
+    def try_spend(self, units):
+        now = time.monotonic()
+        self._expire(now)
+        if self.total + units > self.limit:
+            return False
+        self.spent.append((now, units))
+        self.total += units
+        return True
+
+    def exhaust(self):
+        """Treat the whole budget as spent, e.g. after YouTube reports the quota exceeded"""
+        now = time.monotonic()
+        self._expire(now)
+        if self.total < self.limit:
+            self.spent.append((now, self.limit - self.total))
+            self.total = self.limit
+
+
+class ViewFlusher:
+    """
+    Background thread that writes the views served from the page cache to
+    Playlist.last_analyzed, whether or not the auto refresher runs.
+    """
+
+    def __init__(self, interval=VIEW_FLUSH_INTERVAL):
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the thread and write the views recorded since its last flush"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._flush()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._flush()
+
+    def _flush(self):
+        try:
+            flush_viewed()
+        except Exception as e:
+            print(f"Error recording playlist views: {e}")
+
+
+class AutoRefresher:
+    """
+    Background thread that re-fetches playlists before they go stale,
+    most recently viewed first, within a YouTube API quota budget.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget or QuotaBudget()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._failed_at = {}
+        self._compacted_at = None
+        self.refreshed = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.refresh_stale()
+            except Exception as e:
+                print(f"Auto refresh error: {e}")
+            try:
+                self.compact_stats()
+            except Exception as e:
+                print(f"Video stats compaction error: {e}")
+            self._stop_event.wait(AUTO_REFRESH_INTERVAL)
+
+    def compact_stats(self):
+        """Downsample the video stats history at most once per STATS_COMPACT_INTERVAL"""
+        now = time.monotonic()
+        if self._compacted_at is not None and now - self._compacted_at < STATS_COMPACT_INTERVAL:
+            return
+        self._compacted_at = now
+        compact_video_stats()
+
+    def refresh_stale(self):
+        """Refresh due playlists until none are left, the budget runs out or we are stopped"""
+        if not os.path.exists(TOKEN_FILE):
+            # The OAuth flow needs a browser, so wait for a user to sign in first
+            return 0
+
+        now = time.monotonic()
+        self._failed_at = {
+            playlist_id: failed_at
+            for playlist_id, failed_at in self._failed_at.items()
+            if now - failed_at < AUTO_REFRESH_RETRY_DELAY
+        }
+
+        refreshed = 0
+        stale = get_stale_playlists(max(0, PLAYLIST_MAX_AGE - AUTO_REFRESH_LEAD_TIME))
+        for playlist_id, video_count in stale:
+            if self._stop_event.is_set():
+                break
+            if playlist_id in self._failed_at:
+                continue
+            if not self.budget.try_spend(estimate_refresh_cost(video_count)):
+                print("Auto refresh quota budget used up, waiting for the next window")
+                break
+
+            try:
+                result = refresh_playlist(playlist_id, mark_analyzed=False).result()
+                if "error" in result:
+                    raise ValueError(result["error"])
+                refreshed += 1
+            except googleapiclient.errors.HttpError as e:
+                self._failed_at[playlist_id] = time.monotonic()
+                if e.resp.status == 403 and "quota" in str(e).lower():
+                    print("YouTube API quota exceeded, pausing auto refresh")
+                    self.budget.exhaust()
+                    break
+                print(f"Auto refresh of playlist {playlist_id} failed: {e}")
+            except Exception as e:
+                self._failed_at[playlist_id] = time.monotonic()
+                print(f"Auto refresh of playlist {playlist_id} failed: {e}")
+
+            self._stop_event.wait(AUTO_REFRESH_MIN_DELAY)
+
+        if refreshed:
+            print(f"Auto refreshed {refreshed} stale playlists")
+        self.refreshed += refreshed
+        return refreshed
@@ -0,0 +1,56 @@
+# utils_singleflight.py
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers that arrive while a call
+    for their key is running wait for it and share its result or exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        """Return the future of the running call for `key` and whether we have to run it"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            return future, True
+
+    def _run(self, key, future, fn, args, kwargs):
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def do(self, key, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) unless a call for `key` is running, and return its result"""
+        future, leader = self._join(key)
+        if leader:
+            self._run(key, future, fn, args, kwargs)
+        return future.result()
+
+    def submit(self, executor, key, fn, *args, **kwargs) -> Future:
+        """Like do(), but runs a new call on `executor` and returns its future"""
+        future, leader = self._join(key)
+        if leader:
+            try:
+                executor.submit(self._run, key, future, fn, args, kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+                with self._lock:
+                    self._calls.pop(key, None)
+        return future
+
+    def in_flight(self, key) -> bool:
+        with self._lock:
+            return key in self._calls
@@ -1,227 +1,700 @@
 # utils_sync.py
 import os
+import json
 import time
+import zlib
+import atexit
+import heapq
+import hashlib
+import itertools
 import datetime
 import requests
-import asyncio
 import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import List, Dict, Optional
-from database import SyncTask, get_session, init_db
+from database import SyncItem, SyncTask, get_session, init_db
+from sqlalchemy import bindparam, func, update
 from sqlalchemy.orm import Session
-
-# Global variable to track current sync task
-current_sync_task_id = None
-sync_abort_flag = False
+from utils_events import EventHub
+from utils_playlist import iter_playlist_payloads
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Upload tuning
+SYNC_CONCURRENCY = int(os.environ.get("SYNC_CONCURRENCY", 4))
+SYNC_BATCH_SIZE = int(os.environ.get("SYNC_BATCH_SIZE", 1))  # playlists per request
+SYNC_MAX_RETRIES = int(os.environ.get("SYNC_MAX_RETRIES", 3))
+SYNC_RETRY_BACKOFF = float(os.environ.get("SYNC_RETRY_BACKOFF", 0.5))  # seconds
+SYNC_PROGRESS_INTERVAL = float(os.environ.get("SYNC_PROGRESS_INTERVAL", 1.0))  # seconds
+SYNC_PAYLOAD_FORMAT = os.environ.get("SYNC_PAYLOAD_FORMAT", "json")  # json, ndjson
+SYNC_CONTENT_ENCODING = os.environ.get("SYNC_CONTENT_ENCODING", "identity")  # identity, gzip, zstd
+SYNC_VIDEO_ENCODING = os.environ.get("SYNC_VIDEO_ENCODING", "rows")  # rows, columnar
+SYNC_CHUNKED_UPLOAD = os.environ.get("SYNC_CHUNKED_UPLOAD", "0") == "1"
+
+# How often the write-behind persister flushes task state to sync_tasks
+SYNC_PERSIST_INTERVAL = float(os.environ.get("SYNC_PERSIST_INTERVAL", 1.0))  # seconds
+
+# Sync tasks that may run at the same time, across all targets
+SYNC_MAX_PARALLEL_TASKS = int(os.environ.get("SYNC_MAX_PARALLEL_TASKS", 2))
+
+ACTIVE_STATUSES = ["queued", "started", "inprogress"]
+FINISHED_STATUSES = ["completed", "failed", "aborted"]
+TASK_FIELDS = (
+    "status",
+    "started_at",
+    "completed_at",
+    "total_playlists",
+    "processed_playlists",
+    "error_message",
+    "target",
+    "priority",
+)
+
+_sync_http_session = None
+_sync_http_session_lock = threading.Lock()
+
+
+class SyncTaskState:
+    """Authoritative in-memory state of a running sync task; mirrors SyncTask's columns"""
+
+    def __init__(
+        self,
+        task_id: int,
+        total_playlists: int,
+        processed_playlists: int = 0,
+        target: str = None,
+        priority: int = 0,
+    ):
+        self.id = task_id
+        self.status = "queued"
+        self.started_at = datetime.datetime.now()
+        self.completed_at = None
+        self.total_playlists = total_playlists
+        self.processed_playlists = processed_playlists
+        self.error_message = None
+        self.target = target
+        self.priority = priority
+        self.abort_event = threading.Event()
+
+    def to_row(self) -> dict:
+        row = {field: getattr(self, field) for field in TASK_FIELDS}
+        row["id"] = self.id
+        return row
 
 
 class SyncManager:
     def __init__(self, db_engine):
         self.db_engine = db_engine
-        self.event_subscribers = set()
-        self.event_loop = None
-        self.loop_thread = None
-        self._start_event_loop()
-
-    def _start_event_loop(self):
-        """Start event loop in separate thread"""
-
-        def run_loop():
-            self.event_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self.event_loop)
-            self.event_loop.run_forever()
-
-        self.loop_thread = threading.Thread(target=run_loop, daemon=True)
-        self.loop_thread.start()
+        self.events = EventHub()
 
-        # Wait for loop to be ready
-        while self.event_loop is None:
-            time.sleep(0.01)
+        # Task registry; sync_tasks is only written by the persister below
+        self._tasks = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._flush_requested = threading.Event()
 
-    def add_event_subscriber(self, queue):
-        """Add a queue to receive sync events"""
-        self.event_subscribers.add(queue)
-
-    def remove_event_subscriber(self, queue):
-        """Remove a queue from sync events"""
-        self.event_subscribers.discard(queue)
+        self._fail_interrupted_tasks()
+        self._persister = threading.Thread(target=self._run_persister, daemon=True)
+        self._persister.start()
+        atexit.register(self.flush)
 
     def broadcast_event(self, event_type: str, data: dict):
         """Broadcast sync event to all subscribers (thread-safe)"""
-        if self.event_loop and not self.event_loop.is_closed():
-            asyncio.run_coroutine_threadsafe(
-                self._async_broadcast_event(event_type, data), self.event_loop
-            )
+        self.events.publish(event_type, data)
 
-    async def _async_broadcast_event(self, event_type: str, data: dict):
-        """Internal async method for broadcasting events"""
-        event_data = {"event": event_type, "data": data}
+    def _fail_interrupted_tasks(self):
+        """Tasks left active by a previous process can't still be running; make them resumable"""
+        session = get_session(self.db_engine)
+        try:
+            session.query(SyncTask).filter(SyncTask.status.in_(ACTIVE_STATUSES)).update(
+                {
+                    SyncTask.status: "failed",
+                    SyncTask.completed_at: datetime.datetime.now(),
+                    SyncTask.error_message: "Interrupted by server restart",
+                },
+                synchronize_session=False,
+            )
+            session.commit()
+        finally:
+            session.close()
 
-        # Remove closed queues
-        closed_queues = set()
-        for queue in self.event_subscribers:
+    def _run_persister(self):
+        while True:
+            self._flush_requested.wait(SYNC_PERSIST_INTERVAL)
+            self._flush_requested.clear()
             try:
-                await queue.put(event_data)
-            except:
-                closed_queues.add(queue)
+                self.flush()
+            except Exception as e:
+                print(f"Error persisting sync tasks: {e}")
+
+    def flush(self):
+        """Write changed task state to sync_tasks in one transaction"""
+        with self._lock:
+            rows = [self._tasks[task_id].to_row() for task_id in self._dirty]
+            self._dirty.clear()
+        if not rows:
+            return
 
-        # Clean up closed queues
-        for queue in closed_queues:
-            self.event_subscribers.discard(queue)
-
-    def get_active_sync_task(self) -> Optional[SyncTask]:
-        """Get currently active sync task"""
         session = get_session(self.db_engine)
         try:
-            active_task = (
-                session.query(SyncTask)
-                .filter(SyncTask.status.in_(["started", "inprogress"]))
-                .first()
-            )
-            return active_task
+            session.execute(update(SyncTask), rows)
+            session.commit()
+        except Exception:
+            with self._lock:
+                self._dirty.update(row["id"] for row in rows)
+            raise
         finally:
             session.close()
 
-    def create_sync_task(self, total_playlists: int) -> int:
-        """Create a new sync task and return its ID"""
-        global current_sync_task_id, sync_abort_flag
-
-        # Check if there's already an active sync
-        if self.get_active_sync_task():
-            raise ValueError("Another sync is already in progress")
+        with self._lock:
+            # Finished tasks stay in memory until their final state is stored
+            for row in rows:
+                task = self._tasks.get(row["id"])
+                if (
+                    task
+                    and task.status in FINISHED_STATUSES
+                    and row["id"] not in self._dirty
+                ):
+                    del self._tasks[row["id"]]
+
+    def get_active_sync_tasks(self) -> List[SyncTaskState]:
+        """Get queued and running sync tasks, oldest first"""
+        with self._lock:
+            return sorted(
+                (
+                    task
+                    for task in self._tasks.values()
+                    if task.status in ACTIVE_STATUSES
+                ),
+                key=lambda task: task.id,
+            )
 
+    def get_active_sync_task(self) -> Optional[SyncTaskState]:
+        """Get the oldest active sync task"""
+        active_tasks = self.get_active_sync_tasks()
+        return active_tasks[0] if active_tasks else None
+
+    def _register_task(self, task_id: int, total: int, processed: int = 0, **kwargs):
+        task = SyncTaskState(task_id, total, processed, **kwargs)
+        with self._lock:
+            self._tasks[task_id] = task
+        return task
+
+    def create_sync_task(
+        self, total_playlists: int, target: str = None, priority: int = 0
+    ) -> int:
+        """Create a new queued sync task and return its ID"""
+        # The row is inserted right away to get its ID; later changes are write-behind
         session = get_session(self.db_engine)
         try:
             sync_task = SyncTask(
-                status="started", total_playlists=total_playlists, processed_playlists=0
+                status="queued",
+                total_playlists=total_playlists,
+                processed_playlists=0,
+                target=target,
+                priority=priority,
             )
             session.add(sync_task)
             session.commit()
-            current_sync_task_id = sync_task.id
-            sync_abort_flag = False
-            return sync_task.id
+            task = self._register_task(
+                sync_task.id, total_playlists, target=target, priority=priority
+            )
+            task.started_at = sync_task.started_at
+            return task.id
         finally:
             session.close()
 
     def update_sync_task(self, task_id: int, **kwargs):
         """Update sync task with new data"""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if not task:
+                return
+            for key, value in kwargs.items():
+                setattr(task, key, value)
+
+            finished = kwargs.get("status") in FINISHED_STATUSES
+            if finished:
+                task.completed_at = datetime.datetime.now()
+            self._dirty.add(task_id)
+
+        if finished:
+            self._flush_requested.set()
+
+    def get_sync_task(self, task_id: int) -> Optional[SyncTaskState]:
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def abort_sync_task(self, task_id: int):
+        """Abort a sync task"""
+        with self._lock:
+            task = self._tasks.get(task_id)
+        if not task or task.status not in ACTIVE_STATUSES:
+            raise ValueError(f"Sync task {task_id} is not running")
+        task.abort_event.set()
+
+    def resume_sync_task(self, task_id: int) -> SyncTaskState:
+        """
+        Requeue a failed or aborted sync task. The returned state carries the
+        pending playlist IDs in `pending_playlist_ids`.
+        """
+        with self._lock:
+            if task_id in self._tasks:
+                raise ValueError(f"Sync task {task_id} is still being saved, try again")
+
         session = get_session(self.db_engine)
         try:
             sync_task = session.query(SyncTask).filter(SyncTask.id == task_id).first()
-            if sync_task:
-                for key, value in kwargs.items():
-                    setattr(sync_task, key, value)
+            if not sync_task:
+                raise ValueError(f"Sync task {task_id} not found")
+            if sync_task.status not in ["failed", "aborted"]:
+                raise ValueError(f"Sync task {task_id} is {sync_task.status}")
+
+            pending_ids = [
+                playlist_id
+                for (playlist_id,) in session.query(SyncItem.playlist_id).filter(
+                    SyncItem.task_id == task_id,
+                    SyncItem.status.notin_(["sent", "skipped"]),
+                )
+            ]
+            processed = sync_task.total_playlists - len(pending_ids)
+
+            task = self._register_task(
+                task_id,
+                sync_task.total_playlists,
+                processed,
+                target=sync_task.target,
+                priority=sync_task.priority or 0,
+            )
+            task.started_at = sync_task.started_at
+            task.pending_playlist_ids = pending_ids
+            with self._lock:
+                self._dirty.add(task_id)
+            self._flush_requested.set()
+            return task
+        finally:
+            session.close()
 
-                if kwargs.get("status") in ["completed", "failed", "aborted"]:
-                    sync_task.completed_at = datetime.datetime.now()
+    def add_sync_items(self, task_id: int, playlist_ids: List[str]):
+        """Record every playlist of a sync task as pending"""
+        if not playlist_ids:
+            return
+        session = get_session(self.db_engine)
+        try:
+            session.execute(
+                SyncItem.__table__.insert(),
+                [
+                    {
+                        "task_id": task_id,
+                        "playlist_id": playlist_id,
+                        "status": "pending",
+                        "attempts": 0,
+                        "updated_at": datetime.datetime.now(),
+                    }
+                    for playlist_id in playlist_ids
+                ],
+            )
+            session.commit()
+        finally:
+            session.close()
 
-                session.commit()
+    def update_sync_items(self, task_id: int, results: List[Dict]):
+        """Checkpoint the outcome of sent playlists in one executemany UPDATE"""
+        if not results:
+            return
+        items = SyncItem.__table__
+        stmt = (
+            update(items)
+            .where(
+                items.c.task_id == bindparam("b_task_id"),
+                items.c.playlist_id == bindparam("b_playlist_id"),
+            )
+            .values(
+                status=bindparam("b_status"),
+                attempts=items.c.attempts + bindparam("b_attempts"),
+                content_hash=bindparam("b_content_hash"),
+                updated_at=bindparam("b_updated_at"),
+            )
+        )
+        now = datetime.datetime.now()
+        session = get_session(self.db_engine)
+        try:
+            session.execute(
+                stmt,
+                [
+                    {
+                        "b_task_id": task_id,
+                        "b_playlist_id": result["playlist_id"],
+                        "b_status": result["status"],
+                        "b_attempts": result["attempts"],
+                        "b_content_hash": result["content_hash"],
+                        "b_updated_at": now,
+                    }
+                    for result in results
+                ],
+            )
+            session.commit()
         finally:
             session.close()
 
-    def abort_sync_task(self, task_id: int):
-        """Abort a sync task"""
-        global sync_abort_flag
-        sync_abort_flag = True
-        self.update_sync_task(task_id, status="aborted")
+    def get_last_synced_hashes(self, target: str = None) -> Dict[str, str]:
+        """Content hash of each playlist as of its most recent successful send to `target`"""
+        session = get_session(self.db_engine)
+        try:
+            latest = (
+                session.query(
+                    SyncItem.playlist_id,
+                    func.max(SyncItem.updated_at).label("updated_at"),
+                )
+                .join(SyncTask, SyncTask.id == SyncItem.task_id)
+                .filter(SyncItem.status == "sent", SyncTask.target == target)
+                .group_by(SyncItem.playlist_id)
+                .subquery()
+            )
+            rows = (
+                session.query(SyncItem.playlist_id, SyncItem.content_hash)
+                .join(SyncTask, SyncTask.id == SyncItem.task_id)
+                .join(
+                    latest,
+                    (SyncItem.playlist_id == latest.c.playlist_id)
+                    & (SyncItem.updated_at == latest.c.updated_at),
+                )
+                .filter(SyncItem.status == "sent", SyncTask.target == target)
+            )
+            return {playlist_id: content_hash for playlist_id, content_hash in rows}
+        finally:
+            session.close()
 
     def get_all_sync_tasks(self) -> List[SyncTask]:
-        """Get all sync tasks ordered by started_at desc"""
+        """Get all sync tasks ordered by started_at desc, with in-memory state for live tasks"""
         session = get_session(self.db_engine)
         try:
-            tasks = session.query(SyncTask).order_by(SyncTask.started_at.desc()).all()
-            return tasks
+            tasks = (
+                session.query(SyncTask)
+                .order_by(SyncTask.started_at.desc(), SyncTask.id.desc())
+                .all()
+            )
         finally:
             session.close()
+        with self._lock:
+            return [self._tasks.get(task.id, task) for task in tasks]
+
+
+def get_sync_targets() -> Dict[str, str]:
+    """
+    Named sync targets from SYNC_TARGETS ("name=url,name=url"),
+    falling back to REMOTE_SERVER_URL as the "default" target.
+    """
+    targets = {}
+    for entry in os.environ.get("SYNC_TARGETS", "").split(","):
+        name, separator, url = entry.partition("=")
+        if separator and name.strip() and url.strip():
+            targets[name.strip()] = url.strip()
+    if not targets and os.environ.get("REMOTE_SERVER_URL"):
+        targets["default"] = os.environ["REMOTE_SERVER_URL"]
+    return targets
+
+
+def playlist_content_hash(playlist: Dict) -> str:
+    """Hash of a playlist's sync payload, ignoring when it was last viewed"""
+    content = {key: value for key, value in playlist.items() if key != "last_analyzed"}
+    encoded = json.dumps(content, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _get_sync_http_session() -> requests.Session:
+    """Shared HTTP session so sync requests reuse pooled keep-alive connections"""
+    global _sync_http_session
+    with _sync_http_session_lock:
+        if _sync_http_session is None:
+            _sync_http_session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=SYNC_CONCURRENCY
+            )
+            _sync_http_session.mount("http://", adapter)
+            _sync_http_session.mount("https://", adapter)
+        return _sync_http_session
+
+
+def _is_retryable(error: requests.RequestException) -> bool:
+    """Connection problems, timeouts, throttling and server errors are worth retrying"""
+    if error.response is None:
+        return True
+    return error.response.status_code == 429 or error.response.status_code >= 500
+
+
+def _buffered(chunks, size: int = 64 * 1024):
+    """Coalesce small encoder chunks into blocks of about `size` bytes"""
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def _compress(chunks, compressor):
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def encode_sync_body(batch: List[Dict]) -> tuple:
+    """
+    Incrementally encode a batch of playlists for upload.
+    Returns (iterator of byte chunks, request headers).
+    """
+    if SYNC_PAYLOAD_FORMAT == "ndjson":
+        chunks = (json.dumps(pl, default=str) + "\n" for pl in batch)
+        headers = {"Content-Type": "application/x-ndjson"}
+    else:
+        # A batch of one is sent as the bare playlist, as before batching existed
+        payload = batch[0] if len(batch) == 1 else batch
+        chunks = json.JSONEncoder(default=str).iterencode(payload)
+        headers = {"Content-Type": "application/json"}
+    chunks = (chunk.encode("utf-8") for chunk in chunks)
+
+    if SYNC_CONTENT_ENCODING == "gzip":
+        chunks = _compress(chunks, zlib.compressobj(wbits=31))  # gzip container
+        headers["Content-Encoding"] = "gzip"
+    elif SYNC_CONTENT_ENCODING == "zstd":
+        chunks = _compress(chunks, zstandard.ZstdCompressor().compressobj())
+        headers["Content-Encoding"] = "zstd"
+
+    return _buffered(chunks), headers
+
+
+def _send_batch(
+    http: requests.Session, url: str, batch: List[Dict], abort_event: threading.Event
+) -> tuple:
+    """
+    Post one batch of playlists, retrying with exponential backoff.
+    Returns (attempts, error) where error is None once the batch was accepted.
+    """
+    for attempt in range(SYNC_MAX_RETRIES + 1):
+        try:
+            # Encode afresh on every attempt since the body is a one-shot iterator
+            chunks, headers = encode_sync_body(batch)
+            body = chunks if SYNC_CHUNKED_UPLOAD else b"".join(chunks)
+            response = http.post(url, data=body, headers=headers, timeout=10)
+            response.raise_for_status()
+            return attempt + 1, None
+        except requests.RequestException as req_error:
+            if attempt == SYNC_MAX_RETRIES or not _is_retryable(req_error):
+                return attempt + 1, req_error
+            delay = SYNC_RETRY_BACKOFF * (2**attempt)
+            print(f"Retrying sync request in {delay:.1f}s after error: {req_error}")
+            # An abort cuts the backoff short instead of waiting it out
+            if abort_event.wait(delay):
+                return attempt + 1, req_error
+
+
+def send_playlists_to_api_sync(
+    task_id: int,
+    playlist_ids: List[str],
+    sync_manager: SyncManager,
+    already_processed: int = 0,
+    changed_only: bool = False,
+):
+    """
+    Synchronous background task to send playlists to remote API with real-time updates.
+
+    Payloads are read from the database one playlist at a time while sending, so
+    memory use does not grow with the library. `already_processed` counts playlists
+    acknowledged before a resumed task restarted; with `changed_only`, playlists
+    whose content is unchanged since their last successful sync are skipped.
+    """
+    task = sync_manager.get_sync_task(task_id)
+    if not task:
+        print(f"Sync task {task_id} is not active")
+        return
 
+    URL = get_sync_targets().get(task.target)
+    config_error = None
+    if not URL:
+        config_error = f"Sync target '{task.target}' is not configured"
+    elif SYNC_CONTENT_ENCODING == "zstd" and zstandard is None:
+        config_error = "SYNC_CONTENT_ENCODING=zstd requires the zstandard package"
+    if config_error:
+        sync_manager.update_sync_task(
+            task_id,
+            status="failed",
+            error_message=config_error,
+        )
+        sync_manager.broadcast_event(
+            "failed",
+            {
+                "task_id": task_id,
+                "error": config_error,
+            },
+        )
+        return
 
-def send_playlists_to_api_sync(playlists: List[Dict], sync_manager: SyncManager):
-    """Synchronous background task to send playlists to remote API with real-time updates"""
-    global current_sync_task_id, sync_abort_flag
+    try:
+        total = already_processed + len(playlist_ids)
+        sync_manager.update_sync_task(task_id, status="inprogress")
+        sync_manager.broadcast_event(
+            "inprogress",
+            {
+                "task_id": task_id,
+                "total": total,
+                "processed": already_processed,
+            },
+        )
 
-    URL = os.environ.get("REMOTE_SERVER_URL")
-    if not URL:
-        if current_sync_task_id:
+        http = _get_sync_http_session()
+        last_hashes = sync_manager.get_last_synced_hashes(task.target) if changed_only else {}
+        processed_count = already_processed
+        errors = []
+        checkpoints = []
+        skipped = []
+        last_progress_write = time.monotonic()
+
+        def iter_batches():
+            batch = []
+            for pl in iter_playlist_payloads(
+                playlist_ids, columnar=SYNC_VIDEO_ENCODING == "columnar"
+            ):
+                content_hash = playlist_content_hash(pl)
+                if changed_only and last_hashes.get(pl["id"]) == content_hash:
+                    skipped.append(
+                        {
+                            "playlist_id": pl["id"],
+                            "status": "skipped",
+                            "attempts": 0,
+                            "content_hash": content_hash,
+                        }
+                    )
+                    continue
+                batch.append((pl, content_hash))
+                if len(batch) == SYNC_BATCH_SIZE:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        batches = iter_batches()
+
+        with ThreadPoolExecutor(max_workers=SYNC_CONCURRENCY) as executor:
+            in_flight = {}
+
+            def fill():
+                # Keep at most SYNC_CONCURRENCY batches queued or running
+                while (
+                    len(in_flight) < SYNC_CONCURRENCY
+                    and not task.abort_event.is_set()
+                ):
+                    batch = next(batches, None)
+                    if batch is None:
+                        return
+                    in_flight[
+                        executor.submit(
+                            _send_batch,
+                            http,
+                            URL,
+                            [pl for pl, _ in batch],
+                            task.abort_event,
+                        )
+                    ] = batch
+
+            fill()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = in_flight.pop(future)
+                    titles = ", ".join(pl.get("title", "Unknown") for pl, _ in batch)
+                    attempts, req_error = future.result()
+                    checkpoints.extend(
+                        {
+                            "playlist_id": pl["id"],
+                            "status": "failed" if req_error else "sent",
+                            "attempts": attempts,
+                            "content_hash": content_hash,
+                        }
+                        for pl, content_hash in batch
+                    )
+                    if req_error:
+                        error_msg = f"Network error while sending playlist '{titles}': {req_error}"
+                        print(error_msg)
+                        errors.append(error_msg)
+                        continue
+
+                    processed_count += len(batch)
+                    sync_manager.broadcast_event(
+                        "progress",
+                        {
+                            "task_id": task_id,
+                            "total": total,
+                            "processed": processed_count + len(skipped),
+                            "current_playlist": titles,
+                        },
+                    )
+                    print(f"Successfully sent playlist: {titles}")
+
+                # Write progress and item checkpoints to the DB at most once
+                # per SYNC_PROGRESS_INTERVAL
+                if time.monotonic() - last_progress_write >= SYNC_PROGRESS_INTERVAL:
+                    sync_manager.update_sync_items(task_id, checkpoints + skipped)
+                    processed_count += len(skipped)
+                    checkpoints.clear()
+                    skipped.clear()
+                    sync_manager.update_sync_task(
+                        task_id, processed_playlists=processed_count
+                    )
+                    last_progress_write = time.monotonic()
+
+                fill()
+
+        sync_manager.update_sync_items(task_id, checkpoints + skipped)
+        processed_count += len(skipped)
+
+        if task.abort_event.is_set():
             sync_manager.update_sync_task(
-                current_sync_task_id,
+                task_id,
+                status="aborted",
+                processed_playlists=processed_count,
+            )
+            sync_manager.broadcast_event(
+                "aborted",
+                {"task_id": task_id, "processed": processed_count},
+            )
+            return
+
+        if errors:
+            error_msg = f"{len(errors)} request(s) failed after retries. First error: {errors[0]}"
+            sync_manager.update_sync_task(
+                task_id,
                 status="failed",
-                error_message="REMOTE_SERVER_URL not configured",
+                processed_playlists=processed_count,
+                error_message=error_msg,
             )
             sync_manager.broadcast_event(
                 "failed",
                 {
-                    "task_id": current_sync_task_id,
-                    "error": "REMOTE_SERVER_URL not configured",
+                    "task_id": task_id,
+                    "error": error_msg,
+                    "processed": processed_count,
                 },
             )
-        return
-
-    if not current_sync_task_id:
-        print("No sync task ID available")
-        return
+            return
 
-    try:
-        sync_manager.update_sync_task(current_sync_task_id, status="inprogress")
-        sync_manager.broadcast_event(
-            "inprogress",
-            {"task_id": current_sync_task_id, "total": len(playlists), "processed": 0},
+        sync_manager.update_sync_task(
+            task_id,
+            status="completed",
+            processed_playlists=processed_count,
         )
-
-        processed_count = 0
-
-        for i, pl in enumerate(playlists):
-            if sync_abort_flag:
-                sync_manager.update_sync_task(current_sync_task_id, status="aborted")
-                sync_manager.broadcast_event(
-                    "aborted",
-                    {"task_id": current_sync_task_id, "processed": processed_count},
-                )
-                return
-
-            try:
-                response = requests.post(URL, json=pl, timeout=10)
-                response.raise_for_status()
-
-                processed_count += 1
-                sync_manager.update_sync_task(
-                    current_sync_task_id, processed_playlists=processed_count
-                )
-
-                sync_manager.broadcast_event(
-                    "progress",
-                    {
-                        "task_id": current_sync_task_id,
-                        "total": len(playlists),
-                        "processed": processed_count,
-                        "current_playlist": pl.get("title", "Unknown"),
-                    },
-                )
-
-                print(f"Successfully sent playlist: {pl.get('title', 'Unknown')}")
-                time.sleep(0.1)
-
-            except requests.RequestException as req_error:
-                error_msg = f"Network error while sending playlist '{pl.get('title', 'Unknown')}': {req_error}"
-                print(error_msg)
-
-                sync_manager.update_sync_task(
-                    current_sync_task_id, status="failed", error_message=error_msg
-                )
-                sync_manager.broadcast_event(
-                    "failed",
-                    {
-                        "task_id": current_sync_task_id,
-                        "error": error_msg,
-                        "processed": processed_count,
-                    },
-                )
-                return  # Stop processing on first network error
-
-        sync_manager.update_sync_task(current_sync_task_id, status="completed")
         sync_manager.broadcast_event(
             "completed",
             {
-                "task_id": current_sync_task_id,
-                "total": len(playlists),
+                "task_id": task_id,
+                "total": total,
                 "processed": processed_count,
             },
         )
@@ -229,12 +702,112 @@ def send_playlists_to_api_sync(playlists: List[Dict], sync_manager: SyncManager)
     except Exception as e:
         error_msg = str(e)
         print(f"Unexpected error in sync task: {error_msg}")
-        sync_manager.update_sync_task(
-            current_sync_task_id, status="failed", error_message=error_msg
+        sync_manager.update_sync_task(task_id, status="failed", error_message=error_msg)
+        sync_manager.broadcast_event("failed", {"task_id": task_id, "error": error_msg})
+
+
+class SyncScheduler:
+    """
+    Runs sync tasks from a priority queue, at most `max_parallel` at a time.
+    Higher priority tasks start first; equal priorities run in submission order.
+    """
+
+    def __init__(self, sync_manager: SyncManager, max_parallel: int = SYNC_MAX_PARALLEL_TASKS):
+        self.sync_manager = sync_manager
+        self._queue = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        for _ in range(max_parallel):
+            threading.Thread(target=self._run_worker, daemon=True).start()
+
+    def _enqueue(self, task: SyncTaskState, job: dict):
+        with self._condition:
+            heapq.heappush(self._queue, (-task.priority, next(self._order), job))
+            self._condition.notify()
+        self.sync_manager.broadcast_event(
+            "queued",
+            {"task_id": task.id, "target": task.target, "total": task.total_playlists},
         )
-        sync_manager.broadcast_event(
-            "failed", {"task_id": current_sync_task_id, "error": error_msg}
+
+    def submit(
+        self,
+        target: str,
+        playlist_ids: List[str],
+        priority: int = 0,
+        changed_only: bool = False,
+    ) -> int:
+        """Queue a sync of `playlist_ids` to a named target and return the task ID"""
+        if target not in get_sync_targets():
+            raise ValueError(f"Unknown sync target '{target}'")
+
+        task_id = self.sync_manager.create_sync_task(
+            len(playlist_ids), target=target, priority=priority
+        )
+        self.sync_manager.add_sync_items(task_id, playlist_ids)
+        self._enqueue(
+            self.sync_manager.get_sync_task(task_id),
+            {
+                "task_id": task_id,
+                "playlist_ids": playlist_ids,
+                "already_processed": 0,
+                "changed_only": changed_only,
+            },
+        )
+        return task_id
+
+    def resume(self, task_id: int) -> int:
+        """Queue the unacknowledged playlists of a failed or aborted task again"""
+        task = self.sync_manager.resume_sync_task(task_id)
+        self._enqueue(
+            task,
+            {
+                "task_id": task_id,
+                "playlist_ids": task.pending_playlist_ids,
+                "already_processed": task.processed_playlists,
+                "changed_only": False,
+            },
         )
-    finally:
-        current_sync_task_id = None
-        sync_abort_flag = False
+        return task_id
+
+    def cancel(self, task_id: int):
+        """Drop a queued task, or ask a running one to stop"""
+        with self._condition:
+            for i, (_, _, job) in enumerate(self._queue):
+                if job["task_id"] == task_id:
+                    self._queue.pop(i)
+                    heapq.heapify(self._queue)
+                    break
+            else:
+                job = None
+
+        if job is None:
+            self.sync_manager.abort_sync_task(task_id)
+            return
+
+        task = self.sync_manager.get_sync_task(task_id)
+        self.sync_manager.update_sync_task(task_id, status="aborted")
+        self.sync_manager.broadcast_event(
+            "aborted",
+            {
+                "task_id": task_id,
+                "processed": task.processed_playlists if task else 0,
+            },
+        )
+
+    def _run_worker(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                _, _, job = heapq.heappop(self._queue)
+
+            try:
+                send_playlists_to_api_sync(
+                    job["task_id"],
+                    job["playlist_ids"],
+                    self.sync_manager,
+                    already_processed=job["already_processed"],
+                    changed_only=job["changed_only"],
+                )
+            except Exception as e:
+                print(f"Unexpected error running sync task {job['task_id']}: {e}")
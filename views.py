@@ -1,18 +1,46 @@
 # sync_routes.py
-import asyncio
+import json
+import datetime
 import traceback
 
-from fastapi import APIRouter, Request, BackgroundTasks, HTTPException, Form
-from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from typing import List, Optional
+
+from fastapi import APIRouter, Request, HTTPException, Form, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import (
+    HTMLResponse,
+    JSONResponse,
+    RedirectResponse,
+    StreamingResponse,
+)
 from fastapi.templating import Jinja2Templates
+from pydantic import BaseModel
 
 from utils_playlist import (
-    get_or_analyze_playlist,
     extract_playlist_id,
-    get_playlists,
+    extract_channel_id,
+    analyze_playlists,
+    get_playlist_ids,
+    get_playlist_summaries_async,
+    parse_playlist_cursor,
     delete_playlist,
+    rescore_playlists,
+    get_playlist_growth,
+    get_playlist_videos_page,
+    get_playlist_version,
+    get_library_stats,
+    search_videos,
+    parse_video_cursor,
+    mark_viewed,
+    GROWTH_BUCKETS,
+    PLAYLIST_MAX_AGE,
+    VIDEO_SORT_FIELDS,
 )
-from utils_sync import SyncManager, send_playlists_to_api_sync
+from utils_sync import SyncManager, SyncScheduler, get_sync_targets
+from utils_cache import CachedResponse, cached_response, rendered_pages
+from utils_events import format_sse
+from utils_refresh import get_playlist_stale_while_revalidate
 from database import init_db
 
 router = APIRouter()
@@ -20,12 +48,43 @@ templates = Jinja2Templates(directory="templates")
 
 db_engine = init_db()
 sync_manager = SyncManager(db_engine)
+sync_scheduler = SyncScheduler(sync_manager)
+
+PLAYLISTS_PAGE_SIZE = 60
+VIDEOS_PAGE_SIZE = 100
+VIDEOS_MAX_PAGE_SIZE = 500
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SSE_HEARTBEAT_INTERVAL = 30.0
+
+
+async def _fresh_cached(key):
+    """
+    The cached response for key, unless the playlist's stored data changed
+    since it was rendered, e.g. by rescore.py in another process.
+    """
+    cached = rendered_pages.get(key)
+    if cached is None:
+        return None
+    playlist_id = key[0]
+    if cached.version != await get_playlist_version(playlist_id):
+        rendered_pages.invalidate([playlist_id])
+        return None
+    return cached
 
 
 @router.get("/", response_class=HTMLResponse)
-async def index(request: Request):
+async def index(request: Request, before: str = None):
     try:
-        playlists = get_playlists()
+        # Fetch one extra row to know whether an older page exists
+        playlists = await get_playlist_summaries_async(
+            limit=PLAYLISTS_PAGE_SIZE + 1,
+            before=parse_playlist_cursor(before) if before else None,
+        )
+        next_cursor = None
+        if len(playlists) > PLAYLISTS_PAGE_SIZE:
+            playlists = playlists[:PLAYLISTS_PAGE_SIZE]
+            next_cursor = playlists[-1]["cursor"]
         sync_status = request.query_params.get("sync")
         error_message = request.query_params.get("message")
 
@@ -46,6 +105,7 @@ async def index(request: Request):
             {
                 "request": request,
                 "playlists": playlists,
+                "next_cursor": next_cursor,
                 "message": message,
                 "message_type": message_type,
                 "active_sync": active_sync,
@@ -57,7 +117,7 @@ async def index(request: Request):
 
 
 @router.post("/analyze", response_class=HTMLResponse)
-def analyze(
+async def analyze(
     request: Request, playlist_url: str = Form(...), force_refresh: bool = Form(False)
 ):
     try:
@@ -74,11 +134,59 @@ def analyze(
         )
 
 
+class BatchAnalyzeRequest(BaseModel):
+    playlists: List[str] = []  # playlist IDs or URLs
+    channel_id: Optional[str] = None  # channel ID or /channel/ URL
+    force_refresh: bool = False
+
+
+@router.post("/analyze/batch")
+def analyze_batch(batch: BatchAnalyzeRequest):
+    """Analyze many playlists or a whole channel, streaming NDJSON progress"""
+    try:
+        playlist_ids = [extract_playlist_id(url) for url in batch.playlists]
+        channel_id = extract_channel_id(batch.channel_id) if batch.channel_id else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not playlist_ids and not channel_id:
+        raise HTTPException(
+            status_code=400, detail="Provide playlists or a channel_id to analyze"
+        )
+
+    def progress_generator():
+        try:
+            for event in analyze_playlists(
+                playlist_ids, channel_id, force_refresh=batch.force_refresh
+            ):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            traceback.print_exc()
+            yield json.dumps({"event": "failed", "error": str(e)}) + "\n"
+
+    return StreamingResponse(progress_generator(), media_type="application/x-ndjson")
+
+
 @router.get("/playlist/{playlist_id}", response_class=HTMLResponse)
-def show_playlist(request: Request, playlist_id: str, force_refresh: bool = False):
+async def show_playlist(
+    request: Request, playlist_id: str, force_refresh: bool = False
+):
     try:
-        # Fetch from database or run analysis if not found
-        result = get_or_analyze_playlist(playlist_id, force_refresh)
+        # Repeat views of a playlist that hasn't changed skip the database and Jinja
+        key = (playlist_id, "page")
+        cached = None if force_refresh else await _fresh_cached(key)
+        if cached is not None:
+            age = (datetime.datetime.now() - cached.last_modified).total_seconds()
+            if age < PLAYLIST_MAX_AGE:
+                mark_viewed(playlist_id)
+                return cached_response(request, cached)
+
+        generation = rendered_pages.generation(playlist_id)
+        version = await get_playlist_version(playlist_id)
+        # Serve stored data at once; stale data is refreshed in the background.
+        # The full video list is loaded by the page from /playlist/{id}/videos
+        result = await get_playlist_stale_while_revalidate(
+            playlist_id, force_refresh, top_only=True
+        )
 
         if "error" in result:
             return templates.TemplateResponse(
@@ -88,14 +196,25 @@ def show_playlist(request: Request, playlist_id: str, force_refresh: bool = Fals
         template_data = {
             "request": request,
             "top_videos": result["top_videos"],
-            "all_videos": result["all_videos"],
             "playlist_url": result["playlist_info"]["url"],
             "playlist_id": playlist_id,
             "playlist_info": result["playlist_info"],
             "from_cache": result.get("from_cache", False),
+            "refreshing": result.get("refreshing", False),
         }
 
-        return templates.TemplateResponse("playlist.html", template_data)
+        response = templates.TemplateResponse("playlist.html", template_data)
+        # Only the settled page is cached, not "fresh" or "refreshing" variants
+        if template_data["from_cache"] and not template_data["refreshing"]:
+            entry = CachedResponse(
+                response.body,
+                "text/html",
+                result["playlist_info"]["last_updated"],
+                version,
+            )
+            rendered_pages.put(key, entry, generation)
+            return cached_response(request, entry)
+        return response
 
     except Exception as e:
         traceback.print_exc()
@@ -104,27 +223,178 @@ def show_playlist(request: Request, playlist_id: str, force_refresh: bool = Fals
         )
 
 
+@router.get("/playlist/{playlist_id}/videos")
+async def playlist_videos(
+    request: Request,
+    playlist_id: str,
+    sort: str = "position",
+    order: str = "asc",
+    limit: int = VIDEOS_PAGE_SIZE,
+    after: str = None,
+    q: str = None,
+    top: bool = False,
+):
+    """
+    A page of a playlist's videos, sorted server-side. Pass the returned
+    next_cursor as `after` to get the next page; q filters on title and channel.
+    """
+    if sort not in VIDEO_SORT_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"sort must be one of {', '.join(VIDEO_SORT_FIELDS)}",
+        )
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    try:
+        cursor = parse_video_cursor(after, sort) if after else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    limit = max(1, min(limit, VIDEOS_MAX_PAGE_SIZE))
+    key = (playlist_id, "videos", sort, order, limit, after, q, top)
+    cached = await _fresh_cached(key)
+    if cached is not None:
+        return cached_response(request, cached)
+
+    generation = rendered_pages.generation(playlist_id)
+    version = await get_playlist_version(playlist_id)
+    videos, next_cursor = await get_playlist_videos_page(
+        playlist_id,
+        sort,
+        descending=order == "desc",
+        limit=limit,
+        after=cursor,
+        search=q,
+        top_only=top,
+    )
+    response = JSONResponse(
+        jsonable_encoder(
+            {
+                "playlist_id": playlist_id,
+                "sort": sort,
+                "order": order,
+                "videos": videos,
+                "next_cursor": next_cursor,
+            }
+        )
+    )
+    entry = CachedResponse(response.body, "application/json", version=version)
+    rendered_pages.put(key, entry, generation)
+    return cached_response(request, entry)
+
+
+@router.get("/dashboard", response_class=HTMLResponse)
+async def dashboard(request: Request):
+    """Library totals and per-playlist view distributions"""
+    stats = await get_library_stats()
+    return templates.TemplateResponse(
+        "dashboard.html",
+        {"request": request, "totals": stats["totals"], "playlists": stats["playlists"]},
+    )
+
+
+@router.get("/search", response_class=HTMLResponse)
+async def search(request: Request, q: str = "", page: int = 1):
+    """Search page over all stored video titles and channel names"""
+    page = max(1, page)
+    videos, has_more = await search_videos(
+        q, limit=SEARCH_PAGE_SIZE, offset=(page - 1) * SEARCH_PAGE_SIZE
+    )
+    return templates.TemplateResponse(
+        "search.html",
+        {
+            "request": request,
+            "q": q,
+            "page": page,
+            "videos": videos,
+            "has_more": has_more,
+        },
+    )
+
+
+@router.get("/search/videos")
+async def search_videos_json(
+    q: str, limit: int = SEARCH_PAGE_SIZE, offset: int = 0
+):
+    """Ranked videos matching every word of q as a prefix; pass next_offset to page"""
+    limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+    offset = max(0, offset)
+    videos, has_more = await search_videos(q, limit=limit, offset=offset)
+    return {
+        "query": q,
+        "videos": videos,
+        "next_offset": offset + limit if has_more else None,
+    }
+
+
 @router.get("/playlist/{playlist_id}/delete", response_class=RedirectResponse)
-def delete_playlist_view(playlist_id: str):
+async def delete_playlist_view(playlist_id: str):
     try:
         print("Trying to delete... ")
-        delete_playlist(playlist_id)
+        await run_in_threadpool(delete_playlist, playlist_id)
         return RedirectResponse(url="/", status_code=303)
     except Exception as e:
         traceback.print_exc()
         return RedirectResponse(url="/", status_code=303)
 
 
-@router.get("/sync", response_class=HTMLResponse)
-async def sync_playlists(request: Request, background_tasks: BackgroundTasks):
-    """Start sync process"""
+@router.get("/playlist/{playlist_id}/growth")
+def playlist_growth(
+    playlist_id: str, days: int = 30, bucket: str = "day", video_id: str = None
+):
+    """Views and likes of a playlist's videos over time, from the stats history"""
+    if bucket not in GROWTH_BUCKETS:
+        raise HTTPException(
+            status_code=400, detail=f"bucket must be one of {', '.join(GROWTH_BUCKETS)}"
+        )
+    return {
+        "playlist_id": playlist_id,
+        "bucket": bucket,
+        "points": get_playlist_growth(playlist_id, days, bucket, video_id),
+    }
+
+
+@router.post("/rescore")
+def rescore(playlist_id: str = None):
+    """
+    Recompute top videos from stored stats without calling the YouTube API.
+    Scoring runs in this process; rescore.py --workers spreads it over processes.
+    """
     try:
-        playlists = get_playlists()
+        return rescore_playlists([playlist_id] if playlist_id else None)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
 
-        task_id = sync_manager.create_sync_task(len(playlists))
-        print(f"task_id ------------------------> {task_id}")
 
-        background_tasks.add_task(send_playlists_to_api_sync, playlists, sync_manager)
+@router.get("/sync", response_class=HTMLResponse)
+async def sync_playlists(
+    request: Request,
+    mode: str = "full",
+    target: List[str] = Query(None),
+    priority: int = 0,
+    playlist_id: List[str] = Query(None),
+):
+    """
+    Queue one sync task per target (all configured targets by default);
+    mode=changed only sends playlists changed since their last successful sync
+    to that target, and playlist_id limits the sync to a subset.
+    """
+    try:
+        targets = target or list(get_sync_targets())
+        if not targets:
+            raise ValueError("No sync targets configured")
+        playlist_ids = playlist_id or await run_in_threadpool(get_playlist_ids)
+
+        for name in targets:
+            task_id = await run_in_threadpool(
+                sync_scheduler.submit,
+                name,
+                playlist_ids,
+                priority=priority,
+                changed_only=mode == "changed",
+            )
+            print(f"task_id ------------------------> {task_id} ({name})")
 
         return RedirectResponse(url="/?sync=started", status_code=303)
 
@@ -136,36 +406,47 @@ async def sync_playlists(request: Request, background_tasks: BackgroundTasks):
         )
 
 
+@router.get("/sync/resume/{task_id}", response_class=HTMLResponse)
+async def resume_sync(task_id: int):
+    """Resume a failed or aborted sync, skipping playlists that were already sent"""
+    try:
+        await run_in_threadpool(sync_scheduler.resume, task_id)
+
+        return RedirectResponse(url="/?sync=started", status_code=303)
+
+    except ValueError as e:
+        return RedirectResponse(url="/?sync=error&message=" + str(e), status_code=303)
+    except Exception as e:
+        return RedirectResponse(
+            url="/?sync=error&message=Failed to resume sync", status_code=303
+        )
+
+
 @router.get("/sync/events")
-async def sync_events(request: Request):
+async def sync_events(request: Request, last_event_id: int = None):
     """Server-sent events endpoint for sync updates"""
+    # Browsers send Last-Event-ID when an EventSource reconnects
+    header_id = request.headers.get("last-event-id")
+    if header_id and header_id.isdigit():
+        last_event_id = int(header_id)
 
     async def event_generator():
-        queue = asyncio.Queue()
-        sync_manager.add_event_subscriber(queue)
+        subscriber = sync_manager.events.subscribe(last_event_id)
 
         try:
             while True:
-                try:
-                    # Wait for event with timeout
-                    event = await asyncio.wait_for(queue.get(), timeout=30.0)
-
-                    # Format as SSE
-                    event_type = event.get("event", "message")
-                    data = event.get("data", {})
+                events = await subscriber.get_events(timeout=SSE_HEARTBEAT_INTERVAL)
+                if not events:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": heartbeat\n\n"
+                    continue
 
-                    yield f"event: {event_type}\n"
-                    yield f"data: {data}\n\n"
-
-                except asyncio.TimeoutError:
-                    # Send heartbeat
-                    yield f"event: heartbeat\n"
-                    yield f"data: {{}}\n\n"
+                yield "".join(format_sse(event) for event in events)
 
         except Exception as e:
             print(f"SSE Error: {e}")
         finally:
-            sync_manager.remove_event_subscriber(queue)
+            sync_manager.events.unsubscribe(subscriber)
 
     return StreamingResponse(
         event_generator(),
@@ -179,27 +460,31 @@ async def sync_events(request: Request):
 
 @router.get("/sync/status")
 async def get_sync_status(request: Request):
-    """Get current sync status"""
-    active_task = sync_manager.get_active_sync_task()
-    if active_task:
-        return {
-            "active": True,
-            "task_id": active_task.id,
-            "status": active_task.status,
-            "total": active_task.total_playlists,
-            "processed": active_task.processed_playlists,
-            "started_at": active_task.started_at.isoformat(),
+    """Get current sync status; the top-level fields describe the oldest active task"""
+    active_tasks = [
+        {
+            "task_id": task.id,
+            "target": task.target,
+            "priority": task.priority,
+            "status": task.status,
+            "total": task.total_playlists,
+            "processed": task.processed_playlists,
+            "started_at": task.started_at.isoformat(),
         }
+        for task in sync_manager.get_active_sync_tasks()
+    ]
+    if active_tasks:
+        return {"active": True, **active_tasks[0], "tasks": active_tasks}
     else:
-        return {"active": False}
+        return {"active": False, "tasks": []}
 
 
 @router.post("/sync/abort/{task_id}")
 async def abort_sync(task_id: int):
     """Abort a sync task"""
     try:
-        sync_manager.abort_sync_task(task_id)
-        return {"success": True, "message": "Sync aborted"}
+        sync_scheduler.cancel(task_id)
+        return {"success": True, "message": "Sync abort requested"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -207,7 +492,7 @@ async def abort_sync(task_id: int):
 @router.get("/sync/history", response_class=HTMLResponse)
 async def sync_history(request: Request):
     """Show sync history page"""
-    sync_tasks = sync_manager.get_all_sync_tasks()
+    sync_tasks = await run_in_threadpool(sync_manager.get_all_sync_tasks)
     active_task = sync_manager.get_active_sync_task()
 
     return templates.TemplateResponse(